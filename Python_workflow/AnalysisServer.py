@@ -0,0 +1,281 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+# Only the standard library is imported at module level, so the client side starts in milliseconds; the server
+# imports the analysis modules (pandas, scipy, semopy, ...) once and keeps them, and the data, warm.
+
+DEFAULT_SOCKET = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'server.sock')
+DEFAULT_PORT = 8765
+
+# Finished results kept in memory (least recently used evicted first)
+MAX_RESULTS = 512
+
+# Requests that run an analysis; each is a BatchRunner job (M and optionally X, Y, model, engine, n_rep, seed, ...)
+OPS = ['analyze', 'percent_mediated', 'bootstrap']
+
+# Fields of an analysis record returned for percent_mediated
+PC_FIELDS = ['M', 'X', 'Y', 'n', 'percent_mediated', 'p_a', 'p_b', 'p_c']
+
+
+def default_address():
+    # Unix socket where available, else localhost TCP
+    return DEFAULT_SOCKET if hasattr(socket, 'AF_UNIX') else ('127.0.0.1', DEFAULT_PORT)
+
+
+# ---- worker processes ----
+
+def _warm(cache):
+    # Pool initializer: analysis modules imported and the column store opened once per worker
+    from MediationAnalyzer import MediationAnalyzer
+    from ResultCache import ResultCache
+    if cache:
+        MediationAnalyzer.cache = ResultCache()
+    MediationAnalyzer.data.source.manifest
+
+
+def _run(job):
+    from BatchRunner import plain, run_job
+    from MediationAnalyzer import MediationAnalyzer
+    MediationAnalyzer.data.source.refresh()
+    return plain(run_job(job))
+
+
+# ---- server ----
+
+class AnalysisServer:
+    """
+    Long-running local server for analysis requests, so repeated queries skip interpreter start-up, imports and data
+    loading. Requests and responses are one JSON object per line; see OPS, plus 'ping', 'stats' and 'shutdown'.
+    Analyses run concurrently in a pool of `workers` processes, each with the data and fitted semopy models warm.
+    Identical requests in flight at the same time share one computation, and finished results are kept in memory
+    (bootstraps only when seeded, since an unseeded bootstrap is meant to differ between runs). Results are keyed
+    on the data's content hash, so they are recomputed after the CSV changes.
+    """
+
+    def __init__(self, address=None, workers=2, cache=False):
+        self.address = address or default_address()
+        self.workers, self.cache = workers, cache
+        self.results, self.pending = OrderedDict(), {}
+        # Connection handler tasks, ended at shutdown
+        self.clients = set()
+        self.counts = {'requests': 0, 'computed': 0, 'merged': 0, 'cached': 0, 'errors': 0}
+        self.source = self.pool = self._stop = None
+
+    def __repr__(self):
+        return f"AnalysisServer({self.address}, {self.workers} workers)"
+
+    def _key(self, job):
+        self.source.refresh()
+        return json.dumps({**job, 'data': self.source.manifest['sha256']}, sort_keys=True)
+
+    def _finished(self, key, job, future):
+        self.pending.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        if not job['bootstrap'] or job['seed'] is not None:
+            self.results[key] = future.result()
+            while len(self.results) > MAX_RESULTS:
+                self.results.popitem(last=False)
+
+    async def compute(self, job):
+        # (record, how it was served: 'computed', 'merged' into an identical request in flight, or 'cached')
+        key = self._key(job)
+        if key in self.results:
+            self.results.move_to_end(key)
+            return self.results[key], 'cached'
+        if key in self.pending:
+            served = 'merged'
+        else:
+            future = asyncio.get_running_loop().run_in_executor(self.pool, _run, job)
+            future.add_done_callback(lambda f: self._finished(key, job, f))
+            self.pending[key], served = future, 'computed'
+        # Shielded: a client that disconnects does not cancel the computation other clients are waiting for
+        return await asyncio.shield(self.pending[key]), served
+
+    async def dispatch(self, request):
+        from BatchRunner import normalize
+
+        request = dict(request)
+        op = request.pop('op', None)
+        if op == 'ping':
+            return {'status': 'ok'}
+        if op == 'stats':
+            return {'status': 'ok', 'result': {**self.counts, 'workers': self.workers, 'in_flight': len(self.pending),
+                                               'results': len(self.results)}}
+        if op == 'shutdown':
+            self._stop.set()
+            return {'status': 'ok'}
+        if op not in OPS:
+            raise ValueError(f"Unknown op: {op} (expected one of {OPS + ['ping', 'stats', 'shutdown']})")
+
+        job = normalize({**request, 'bootstrap': op == 'bootstrap'})
+        if op == 'percent_mediated' and job['model'] != 'r':
+            # PC_FIELDS come from the a/b/c paths, which only the semopy model ('r') reports
+            raise ValueError(f"percent_mediated needs model 'r' (got {job['model']!r}); use 'analyze' instead")
+        record, served = await self.compute(job)
+        self.counts[served] += 1
+        result = {**job, **record}
+        if op == 'percent_mediated':
+            result = {field: result.get(field) for field in PC_FIELDS}
+        return {'status': 'ok', 'served': served, 'result': result}
+
+    async def _handle(self, reader, writer):
+        # One connection: any number of request lines, answered in order
+        self.clients.add(asyncio.current_task())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.counts['requests'] += 1
+                try:
+                    response = await self.dispatch(json.loads(line))
+                except Exception as e:
+                    self.counts['errors'] += 1
+                    response = {'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+                writer.write((json.dumps(response) + '\n').encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            # Client gone, or the server is shutting down (see serve)
+            pass
+        finally:
+            self.clients.discard(asyncio.current_task())
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve(self):
+        from MediationAnalyzer import MediationAnalyzer
+
+        # Imports and data are loaded here first, so forked workers start warm
+        self.source = MediationAnalyzer.data.source
+        self.source.manifest
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm, initargs=(self.cache,))
+        # Workers are started before any connection is accepted: a worker forked later would inherit the open client
+        # sockets and keep them open after the server closes them
+        await asyncio.get_running_loop().run_in_executor(self.pool, os.getpid)
+        self._stop = asyncio.Event()
+
+        if isinstance(self.address, str):
+            if os.path.exists(self.address):
+                if ping(self.address):
+                    raise RuntimeError(f"A server is already listening on {self.address}")
+                os.remove(self.address)
+            os.makedirs(os.path.dirname(self.address), exist_ok=True)
+            server = await asyncio.start_unix_server(self._handle, path=self.address)
+        else:
+            server = await asyncio.start_server(self._handle, *self.address)
+
+        print(f">>> Serving on {self.address} with {self.workers} workers", flush=True)
+        try:
+            async with server:
+                await self._stop.wait()
+                # Open connections (including the one that asked to stop) are ended here, rather than left to be
+                # cancelled by asyncio.run
+                for task in self.clients:
+                    task.cancel()
+                await asyncio.gather(*self.clients)
+        finally:
+            self.pool.shutdown(cancel_futures=True)
+            if isinstance(self.address, str) and os.path.exists(self.address):
+                os.remove(self.address)
+
+
+# ---- client ----
+
+def request(payload, address=None, timeout=None):
+    """
+    Sends one request (e.g. {'op': 'percent_mediated', 'M': 'WISC_FSIQ'}) and returns the response dict. Raises
+    RuntimeError when the server reports an error.
+    """
+    address = address or default_address()
+    family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(address)
+        sock.sendall((json.dumps(payload) + '\n').encode())
+        with sock.makefile('rb') as f:
+            line = f.readline()
+    if not line:
+        raise RuntimeError(f"No response from {address}")
+
+    response = json.loads(line)
+    if response['status'] != 'ok':
+        raise RuntimeError(response['error'])
+    return response
+
+
+def ping(address=None):
+    try:
+        request({'op': 'ping'}, address, timeout=1)
+        return True
+    except OSError:
+        return False
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local analysis server (serve) and its thin client (other commands).")
+    parser.add_argument("command", choices=["serve", "pc", "analyze", "bootstrap", "stats", "stop"],
+                        help="serve: start the server; pc: percent mediated (like main.py --pc); analyze: full-sample "
+                             "fit; bootstrap: fit and bootstrap intervals; stats: request counts; stop: shut down.")
+    parser.add_argument("mediators", nargs='*', help="Mediator variable(s) for pc/analyze/bootstrap.")
+    parser.add_argument("--socket", action="store", default=None,
+                        help=f"Unix socket path. (DEFAULT: {DEFAULT_SOCKET}, or localhost:{DEFAULT_PORT} without "
+                             f"Unix sockets)")
+    parser.add_argument("--port", action="store", type=int, default=None,
+                        help="Use localhost TCP on this port instead of a Unix socket.")
+    parser.add_argument("--workers", action="store", type=int, default=2,
+                        help="serve: worker processes that run analyses concurrently. (DEFAULT: 2)")
+    parser.add_argument("--cache", action="store_true",
+                        help="serve: also use the on-disk result cache (.cache/results) in the workers.")
+    parser.add_argument("-m", action="store", default="r", choices=["sm", "r"],
+                        help="analyze: model, as in main.py; pc needs r. (DEFAULT: r)")
+    parser.add_argument("-e", action="store", default="semopy", choices=["semopy", "numpy"],
+                        help="Estimation engine, as in main.py. (DEFAULT: semopy)")
+    parser.add_argument("-d", action="store", default=None,
+                        help="Named row subset (Dataset.SUBSETS: ados, asd, adhd). (DEFAULT: full data)")
+    parser.add_argument("-n", action="store", type=int, default=2000,
+                        help="bootstrap: number of replicates. (DEFAULT: 2000)")
+    parser.add_argument("--seed", action="store", type=int, default=None, help="bootstrap: random seed.")
+    args = parser.parse_args()
+    if args.command == 'pc' and args.m != 'r':
+        parser.error("pc needs -m r (the sm summary has no a/b/c paths); use analyze -m sm")
+
+    address = args.socket or (('127.0.0.1', args.port) if args.port else None)
+    if args.command == 'serve':
+        asyncio.run(AnalysisServer(address, workers=args.workers, cache=args.cache).serve())
+        sys.exit(0)
+    if args.command in ['stats', 'stop']:
+        response = request({'op': 'stats' if args.command == 'stats' else 'shutdown'}, address)
+        print(json.dumps(response.get('result', 'stopped')))
+        sys.exit(0)
+
+    failed = 0
+    for mediator in args.mediators:
+        payload = {'op': {'pc': 'percent_mediated'}.get(args.command, args.command), 'M': mediator,
+                   'model': args.m, 'engine': args.e, 'subset': args.d, 'n_rep': args.n, 'seed': args.seed}
+        try:
+            result = request(payload, address)['result']
+        except RuntimeError as e:
+            failed += 1
+            print(f'!!!! {mediator}: {e} !!!!')
+            continue
+
+        if args.command == 'pc':
+            from termcolor import colored
+
+            summary = (f">>> {round(result['percent_mediated'], 3)}% of effect mediated by "
+                       f"{mediator.replace('_', ' ')} (Data count: {result['n']})")
+            significant = all(result[p] < 0.05 for p in ['p_a', 'p_b', 'p_c'])
+            print(colored(f"***{summary}***", attrs=['bold']) if significant else summary)
+        else:
+            print(json.dumps(result))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,156 @@
+import csv
+import json
+import os
+import sys
+
+from MediationAnalyzer import MediationAnalyzer
+
+JOB_DEFAULTS = {'X': 'PrimaryDx_ASD', 'Y': 'PercentAccuracy_GTI', 'model': 'r', 'engine': 'semopy',
+                'bootstrap': False, 'n_rep': 2000, 'seed': None, 'n_jobs': 1, 'tol': None,
+                'method': 'bootstrap', 'subset': None}
+
+# statsmodels summary rows reported for model 'sm'
+SM_ROWS = {'acme': 'ACME (average)', 'ade': 'ADE (average)', 'total_effect': 'Total effect',
+           'prop_mediated': 'Prop. mediated (average)'}
+
+# Column order for CSV output (JSONL records only carry the fields that apply to the job)
+FIELDS = (['job', 'status', 'error'] + list(JOB_DEFAULTS) + ['M', 'n', 'n_dropped']
+          + ['a', 'b', 'c', 'p_a', 'p_b', 'p_c', 'indirect', 'total', 'percent_mediated']
+          + [f'{path}_ci_{bound}' for path in ['a', 'b', 'c'] for bound in ['lower', 'upper']]
+          + ['p_sig_a', 'p_sig_b', 'p_sig_c', 'percent_mediated_ci_lower', 'percent_mediated_ci_upper']
+          + ['indirect_ci_lower', 'indirect_ci_upper', 'total_ci_lower', 'total_ci_upper', 'sobel_z', 'sobel_p']
+          + ['bootstrap_n', 'mc_error', 'not_converged']
+          + [f'{key}{suffix}' for key in SM_ROWS for suffix in ['', '_ci_lower', '_ci_upper', '_p']])
+
+
+def _as_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ['1', 'true', 'yes', 'y']
+    return bool(value)
+
+
+def normalize(job):
+    # Job with defaults filled in and typed fields converted (CSV specs arrive as strings)
+    job = {**JOB_DEFAULTS, **{k: v for k, v in job.items() if v not in ['', None]}}
+    if 'M' not in job:
+        raise ValueError(f"Job {job} has no mediator (M).")
+    if job['model'] not in ['r', 'sm']:
+        # Joint models (parallel/serial) have one row per path and mediator, not the a/c/b table read by run_job
+        raise ValueError(f"Job {job} has model {job['model']!r}; batch jobs support models 'r' and 'sm'.")
+
+    job['bootstrap'] = _as_bool(job['bootstrap'])
+    job['n_rep'] = int(job['n_rep'])
+    job['n_jobs'] = int(job['n_jobs'])
+    job['seed'] = None if job['seed'] is None else int(job['seed'])
+    job['tol'] = None if job['tol'] is None else float(job['tol'])
+    return job
+
+
+def load_jobs(path):
+    # Job spec: a JSON/YAML list of jobs (or {"jobs": [...]}), or a CSV with one job per row
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, newline='') as f:
+        if ext == '.csv':
+            jobs = list(csv.DictReader(f))
+        elif ext in ['.yaml', '.yml']:
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError(f"YAML job spec {path} needs PyYAML (pip install pyyaml); "
+                                 f"use a .json or .csv spec without it.") from None
+            jobs = yaml.safe_load(f)
+        elif ext == '.json':
+            jobs = json.load(f)
+        else:
+            raise ValueError(f"Unsupported job spec format: {ext} (expected .json, .yaml/.yml or .csv)")
+
+    if isinstance(jobs, dict):
+        jobs = jobs['jobs']
+    return [normalize(job) for job in jobs]
+
+
+def plain(record):
+    # numpy scalars -> Python numbers, for JSON
+    return {k: (v.item() if hasattr(v, 'item') else v) for k, v in record.items()}
+
+
+def run_job(job, sample=MediationAnalyzer.data):
+    if job['subset'] not in [None, 'data']:
+        # Stratified jobs: the same Dataset restricted to a named row subset (see Dataset.SUBSETS)
+        sample = sample.with_subset(job['subset'])
+    m = MediationAnalyzer(job['M'], X=job['X'], Y=job['Y'], sample=sample, quiet=True)
+    n_total = m.data.shape[0]
+    m.clean_data(info=False)
+    record = {'n': m.data.shape[0], 'n_dropped': n_total - m.data.shape[0]}
+
+    if job['model'] == 'sm':
+        summary = m.analyze(model='sm', engine=job['engine'], n_rep=job['n_rep'], seed=job['seed'])
+        for key, row in SM_ROWS.items():
+            record[key] = summary.loc[row, 'Estimate']
+            record[f'{key}_ci_lower'] = summary.loc[row, 'Lower CI bound']
+            record[f'{key}_ci_upper'] = summary.loc[row, 'Upper CI bound']
+            record[f'{key}_p'] = summary.loc[row, 'P-value']
+        return record
+
+    table = m.analyze(model=job['model'], engine=job['engine'])
+    a, c, b = table.Estimate[0:3]
+    p_a, p_c, p_b = table['p-value'][0:3]
+    record.update({'a': a, 'b': b, 'c': c, 'p_a': p_a, 'p_b': p_b, 'p_c': p_c,
+                   'indirect': a * b, 'total': c + a * b, 'percent_mediated': abs(a * b / (c + a * b)) * 100})
+
+    if job['bootstrap']:
+        result = m.analyze(model='r', bootstrap=True, engine=job['engine'], n_rep=job['n_rep'], n_jobs=job['n_jobs'],
+                           seed=job['seed'], tol=job['tol'], method=job['method'])
+        ci = result.ci()
+        p_sig_prop = result.significance(0.05)
+        for path in ci.index:
+            record[f'{path}_ci_lower'], record[f'{path}_ci_upper'] = ci.loc[path]
+            record[f'p_sig_{path}'] = p_sig_prop[path]
+
+        effects = result.effects()
+        for effect in effects.index:
+            record[f'{effect}_ci_lower'], record[f'{effect}_ci_upper'] = effects.loc[effect]
+        if m.sobel is not None:
+            record['sobel_z'], record['sobel_p'] = m.sobel['z'], m.sobel['p']
+
+        # Replicates actually run (fewer than n_rep when an adaptive tol was met) and the largest relative MC error
+        record['bootstrap_n'] = len(result)
+        record['mc_error'] = result.mc_errors()['relative'].max()
+        record['not_converged'] = len(result.dropped)
+
+    return record
+
+
+def run_batch(jobs, out='-', fmt=None, sample=MediationAnalyzer.data):
+    """
+    Runs every job without pauses or prompts and writes one record per job (JSONL or CSV, from the out
+    extension unless fmt is given) as soon as it finishes. A failing job is reported with status 'error'
+    and does not stop the batch. Returns the number of failed jobs.
+    """
+    fmt = fmt or ('csv' if out.lower().endswith('.csv') else 'jsonl')
+    stream = sys.stdout if out == '-' else open(out, 'w', newline='')
+    writer = csv.DictWriter(stream, fieldnames=FIELDS, restval='', extrasaction='ignore') if fmt == 'csv' else None
+    if writer is not None:
+        writer.writeheader()
+
+    failed = 0
+    try:
+        for i, job in enumerate(jobs):
+            record = {'job': i, 'status': 'ok', **job}
+            try:
+                record.update(run_job(job, sample))
+            except Exception as e:
+                failed += 1
+                record.update(status='error', error=f"{type(e).__name__}: {e}")
+
+            record = plain(record)
+            if writer is not None:
+                writer.writerow(record)
+            else:
+                stream.write(json.dumps(record) + '\n')
+            stream.flush()
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+
+    return failed
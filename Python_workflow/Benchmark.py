@@ -0,0 +1,177 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+import SyntheticData
+from DataSource import DataSource
+from MediationAnalyzer import MediationAnalyzer
+from MediationSweep import sweep
+
+STAGES = ['load', 'clean', 'fit', 'sm', 'bootstrap', 'sweep']
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'benchmarks')
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+
+def measure(fn, repeat=1):
+    """
+    Best wall time over repeat untraced runs, then the peak traced (Python + numpy) memory of one more run.
+    Memory is traced in a run of its own because tracemalloc hooks every allocation and slows fn several-fold.
+    Returns (seconds, peak MB, fn's result from the first run).
+    """
+    times = []
+    for i in range(repeat):
+        start = perf_counter()
+        run = fn()
+        times.append(perf_counter() - start)
+        if i == 0:
+            result = run
+
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return min(times), peak / 2 ** 20, result
+
+
+def run_benchmarks(sizes, stages=STAGES, mediator='WISC_FSIQ', engine='numpy', n_rep=1000, missing=0.2, seed=0,
+                   repeat=1, n_jobs=1, log=print):
+    """
+    Times each stage on synthetic data (SyntheticData.generate) of every size in sizes and returns one record per
+    (stage, n): seconds, peak_mb and a few result values used to check results against a baseline.
+    Stages: load (cold DataSource load, including its column cache build), clean, fit (analyze 'r'), sm (analyze
+    'sm'), bootstrap (analyze 'r' with n_rep replicates) and sweep (all 11 mediators with MediationSweep).
+    """
+    records = []
+    for n in sizes:
+        path = SyntheticData.write_csv(os.path.join(BENCH_DIR, f'synthetic_n{n}_miss{missing}_seed{seed}.csv'), n,
+                                       missing=missing, seed=seed)
+        cache_dir = tempfile.mkdtemp(prefix='bench_', dir=BENCH_DIR)
+        source = DataSource(path, cache_dir=cache_dir)
+        m = None
+
+        def clean():
+            analyzer = MediationAnalyzer(mediator, sample=source, quiet=True)
+            analyzer.clean_data(info=False)
+            return analyzer
+
+        def fit():
+            table = m.analyze(model='r', engine=engine)
+            return list(table.Estimate[0:3])
+
+        def sm():
+            summary = m.analyze(model='sm', engine=engine, n_rep=n_rep, seed=seed)
+            return list(summary.loc[['ACME (average)', 'ADE (average)', 'Total effect'], 'Estimate'])
+
+        def bootstrap():
+            result = m.analyze(model='r', bootstrap=True, engine=engine, n_rep=n_rep, seed=seed, n_jobs=n_jobs)
+            return list(result.ci().to_numpy().ravel())
+
+        def run_sweep():
+            return list(sweep(source, list(SyntheticData.MEDIATORS))['indirect'])
+
+        def load():
+            # Cold load every run: a fresh column cache is built each time
+            cold = DataSource(path, cache_dir=tempfile.mkdtemp(dir=cache_dir))
+            return len(cold.load([SyntheticData.X, SyntheticData.Y, mediator]))
+
+        stage_fns = {'load': load, 'clean': clean,
+                     'fit': fit, 'sm': sm, 'bootstrap': bootstrap, 'sweep': run_sweep}
+        try:
+            # The other stages read from source, whose column cache is built once up front
+            source.manifest
+            for stage in [stage for stage in STAGES if stage in stages]:
+                # The model stages run on the cleaned (complete-case) sample, as in main.py
+                if m is None and stage in ['fit', 'sm', 'bootstrap']:
+                    m = clean()
+
+                seconds, peak_mb, result = measure(stage_fns[stage], repeat=repeat)
+                if stage == 'clean':
+                    m, result = result, result.data.shape[0]
+                records.append({'stage': stage, 'n': n, 'seconds': seconds, 'peak_mb': peak_mb,
+                                'result': np.atleast_1d(result).astype(float).tolist()})
+                log(f"{stage:>10} n={n:<9} {seconds:9.3f} s {peak_mb:9.1f} MB")
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    return records
+
+
+def compare(records, baseline, time_tol=0.25, min_seconds=0.05, rtol=1e-6):
+    """
+    Checks records against baseline records (same stage and n): a stage regresses when it is more than time_tol
+    slower (and at least min_seconds slower), or when its result values differ beyond rtol. Returns the records
+    as a DataFrame with baseline_seconds, ratio and status columns.
+    """
+    base = {(r['stage'], r['n']): r for r in baseline}
+    rows = []
+    for record in records:
+        row = {k: record[k] for k in ['stage', 'n', 'seconds', 'peak_mb']}
+        ref = base.get((record['stage'], record['n']))
+        if ref is None:
+            row.update(baseline_seconds=np.nan, ratio=np.nan, status='new')
+        else:
+            slower = record['seconds'] > ref['seconds'] * (1 + time_tol) \
+                and record['seconds'] - ref['seconds'] > min_seconds
+            changed = len(record['result']) != len(ref['result']) \
+                or not np.allclose(record['result'], ref['result'], rtol=rtol, equal_nan=True)
+            status = 'RESULT CHANGED' if changed else 'SLOWER' if slower else 'ok'
+            row.update(baseline_seconds=ref['seconds'], ratio=record['seconds'] / ref['seconds'], status=status)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the mediation workflow on synthetic data.")
+    parser.add_argument("--sizes", nargs='+', type=int, default=[10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6],
+                        help="Sample sizes to benchmark. (DEFAULT: 1000 10000 100000 1000000)")
+    parser.add_argument("--stages", nargs='+', default=STAGES, choices=STAGES, help="Stages to run. (DEFAULT: all)")
+    parser.add_argument("-e", action="store", default="numpy", choices=["semopy", "numpy"],
+                        help="Estimation engine for fit/sm/bootstrap. (DEFAULT: numpy)")
+    parser.add_argument("-n", action="store", type=int, default=1000,
+                        help="Bootstrap replicates for the sm and bootstrap stages. (DEFAULT: 1000)")
+    parser.add_argument("-j", action="store", type=int, default=1, help="Worker processes for the bootstrap stage.")
+    parser.add_argument("--missing", action="store", type=float, default=0.2,
+                        help="MCAR missingness rate of every mediator in the synthetic data. (DEFAULT: 0.2)")
+    parser.add_argument("--seed", action="store", type=int, default=0, help="Seed for the data and bootstraps.")
+    parser.add_argument("--repeat", action="store", type=int, default=1,
+                        help="Runs per stage; the best time is reported. (DEFAULT: 1)")
+    parser.add_argument("--baseline", action="store", default=DEFAULT_BASELINE,
+                        help="Baseline JSON to compare against (or to write with --save-baseline).")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline.")
+    parser.add_argument("--out", action="store", default=None, help="Also write the records to this JSON file.")
+    args = parser.parse_args()
+
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    records = run_benchmarks(args.sizes, args.stages, engine=args.e, n_rep=args.n, missing=args.missing,
+                             seed=args.seed, repeat=args.repeat, n_jobs=args.j)
+    settings = {'engine': args.e, 'n_rep': args.n, 'missing': args.missing, 'seed': args.seed}
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'settings': settings, 'records': records}, f, indent=1)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'settings': settings, 'records': records}, f, indent=1)
+        print(f"Baseline written to {args.baseline}")
+
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['settings'] != settings:
+            print(f"Baseline settings {baseline['settings']} differ from this run ({settings}); not comparing.")
+            sys.exit(0)
+        report = compare(records, baseline['records'])
+        print('')
+        print(report.to_string(index=False))
+        sys.exit(1 if (report['status'].isin(['SLOWER', 'RESULT CHANGED'])).any() else 0)
@@ -0,0 +1,348 @@
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+import Instrumentation
+
+# Same row order as semopy's inspect() for the single mediator model: 0: A Path, 1: C Path, 2: B Path
+PATHS = ['a', 'c', 'b']
+
+# Replicates are drawn in fixed-size blocks, each with its own SeedSequence child, so a given seed
+# produces the same replicates no matter how the blocks are spread over worker processes
+BLOCK_SIZE = 50
+
+# Per-process state set by _init_worker (the block function and its data are shipped once per worker)
+_worker_state = {}
+
+
+def resample_indices(n, n_rep, rng=None):
+    # All bootstrap resamples at once, one row of row-indices per replicate
+    rng = np.random.default_rng(rng)
+    return rng.integers(0, n, size=(n_rep, n))
+
+
+def cross_products(x, m, y):
+    # Centered sums of squares / cross-products along the last axis
+    xc = x - x.mean(axis=-1, keepdims=True)
+    mc = m - m.mean(axis=-1, keepdims=True)
+    yc = y - y.mean(axis=-1, keepdims=True)
+    return ((xc * xc).sum(-1), (xc * mc).sum(-1), (xc * yc).sum(-1),
+            (mc * mc).sum(-1), (mc * yc).sum(-1), (yc * yc).sum(-1))
+
+
+def paths_from_moments(sxx, sxm, sxy, smm, smy, syy, n):
+    """
+    Closed-form ML solution of M ~ a*X, Y ~ c*X + b*M from centered cross-products.
+    Every argument may be an array (one entry per replicate); returns estimates, standard errors, p-values
+    and the two residual variances, path arrays stacked on the last axis in PATHS order.
+    """
+    # Mediator model: M ~ a*X
+    a = sxm / sxx
+    var_m = (smm - a * sxm) / n
+
+    # Outcome model: Y ~ c*X + b*M (2x2 normal equations solved explicitly)
+    det = sxx * smm - sxm ** 2
+    c = (smm * sxy - sxm * smy) / det
+    b = (sxx * smy - sxm * sxy) / det
+    var_y = (syy - c * sxy - b * smy) / n
+
+    # ML standard errors (divisor n), as reported by semopy's inspect()
+    se_a = np.sqrt(var_m / sxx)
+    se_c = np.sqrt(var_y * smm / det)
+    se_b = np.sqrt(var_y * sxx / det)
+
+    estimates = np.stack([a, c, b], axis=-1)
+    std_errs = np.stack([se_a, se_c, se_b], axis=-1)
+    pvals = 2 * norm.sf(np.abs(estimates / std_errs))
+
+    return estimates, std_errs, pvals, np.stack([var_m, var_y], axis=-1)
+
+
+def fit_paths(x, m, y):
+    # Full-sample fit for 1-D x, m, y
+    x, m, y = (np.asarray(v, dtype=np.float64) for v in (x, m, y))
+    return paths_from_moments(*cross_products(x, m, y), len(x))
+
+
+def bootstrap_paths(x, m, y, idx, batch_size=None):
+    """
+    a, c, b estimates, standard errors and p-values for every bootstrap resample in idx (n_rep x n).
+    Replicates are processed in batches so the gathered (batch x n) arrays stay small for large n.
+    """
+    x, m, y = (np.asarray(v, dtype=np.float64) for v in (x, m, y))
+    n_rep, n = idx.shape
+    if batch_size is None:
+        batch_size = max(1, 2_000_000 // max(n, 1))
+
+    estimates = np.empty((n_rep, 3))
+    std_errs = np.empty((n_rep, 3))
+    pvals = np.empty((n_rep, 3))
+
+    for start in range(0, n_rep, batch_size):
+        rows = idx[start:start + batch_size]
+        moments = cross_products(x[rows], m[rows], y[rows])
+        est, se, p, _ = paths_from_moments(*moments, n)
+        estimates[start:start + len(rows)] = est
+        std_errs[start:start + len(rows)] = se
+        pvals[start:start + len(rows)] = p
+
+    return estimates, std_errs, pvals
+
+
+def resample_counts(n, n_rep, rng=None):
+    # Multinomial bootstrap weights: how many times each row appears in each of n_rep resamples (n_rep x n)
+    idx = resample_indices(n, n_rep, rng)
+    offsets = (np.arange(n_rep) * n)[:, None]
+    return np.bincount((idx + offsets).ravel(), minlength=n_rep * n).reshape(n_rep, n).astype(np.float64)
+
+
+def batched_ols(design, y, weights, std_errs=False):
+    """
+    Weighted least squares of y on a pre-built design matrix (n x p) for every row of weights (n_rep x n) at once:
+    the Gram matrices and X'y for all replicates come from two matrix products. Returns the (n_rep x p) coefficients
+    and the (n_rep,) weighted residual sums of squares, plus the ML (divisor n) standard errors with std_errs=True.
+    """
+    n, p = design.shape
+    gram = (weights @ (design[:, :, None] * design[:, None, :]).reshape(n, p * p)).reshape(-1, p, p)
+    xty = weights @ (design * y[:, None])
+    params = np.linalg.solve(gram, xty[:, :, None])[:, :, 0]
+    ssr = weights @ (y * y) - (params * xty).sum(axis=1)
+    if not std_errs:
+        return params, ssr
+
+    sigma2 = ssr / weights.sum(axis=1)
+    se = np.sqrt(sigma2[:, None] * np.diagonal(np.linalg.inv(gram), axis1=1, axis2=2))
+    return params, ssr, se
+
+
+def inspect_table(X, Y, M, x, m, y):
+    # Closed-form counterpart of semopy's model.inspect() for the single mediator model
+    return fit_table(X, Y, M, *fit_paths(x, m, y), len(x))
+
+
+def fit_table(X, Y, M, est, se, p, resid, n):
+    # semopy inspect() layout of a closed-form fit (see paths_from_moments) on n rows
+    resid_se = resid * np.sqrt(2 / n)
+
+    return pd.DataFrame({
+        'lval': [M, Y, Y, M, Y],
+        'op': ['~', '~', '~', '~~', '~~'],
+        'rval': [X, X, M, M, Y],
+        'Estimate': np.r_[est, resid],
+        'Std. Err': np.r_[se, resid_se],
+        'z-value': np.r_[est / se, resid / resid_se],
+        'p-value': np.r_[p, 2 * norm.sf(resid / resid_se)],
+    })
+
+
+def loo_coefficients(design, y):
+    """
+    Leave-one-out OLS coefficients (n x p) of y on design (n x p) without refitting: dropping row i moves the
+    full-sample solution by (X'X)^-1 x_i e_i / (1 - h_i), with e_i its residual and h_i its leverage.
+    """
+    projection = design @ np.linalg.inv(design.T @ design)
+    params = projection.T @ y
+    resid = y - design @ params
+    leverage = (projection * design).sum(axis=1)
+    return params - projection * (resid / (1 - leverage))[:, None]
+
+
+def jackknife_paths(x, m, y):
+    # a, c, b estimates (n x 3, PATHS order) with each row left out in turn, in one pass (see loo_coefficients)
+    x, m, y = (np.asarray(v, dtype=np.float64) for v in (x, m, y))
+    xc, mc, yc = x - x.mean(), m - m.mean(), y - y.mean()
+    ones = np.ones_like(xc)
+    a = loo_coefficients(np.column_stack([ones, xc]), mc)[:, 1]
+    c, b = loo_coefficients(np.column_stack([ones, xc, mc]), yc)[:, 1:].T
+    return np.column_stack([a, c, b])
+
+
+def numpy_block(x, m, y, seed, size):
+    # One block of closed-form replicates
+    idx = resample_indices(len(x), size, np.random.default_rng(seed))
+    estimates, std_errs, pvals = bootstrap_paths(x, m, y, idx)
+    return estimates, pvals, std_errs
+
+
+def _init_worker(block_fn, args):
+    _worker_state['block_fn'] = block_fn
+    _worker_state['args'] = args
+
+
+def _run_block(seed, size):
+    # Timed in the worker, so block records show the work itself rather than time spent queued
+    return Instrumentation.timed(_worker_state['block_fn'], *_worker_state['args'], seed, size)
+
+
+def _block_sizes(n_rep):
+    return [min(BLOCK_SIZE, n_rep - start) for start in range(0, n_rep, BLOCK_SIZE)]
+
+
+def process_pool(n_jobs, n_tasks, initializer=None, initargs=()):
+    # Pool of min(n_jobs, n_tasks) worker processes (n_jobs None or < 1 uses every core); None means run in-process
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count()
+    if min(n_jobs, n_tasks) <= 1:
+        return None
+    return ProcessPoolExecutor(max_workers=min(n_jobs, n_tasks), initializer=initializer, initargs=initargs)
+
+
+def _run_blocks(pool, block_fn, args, seeds, sizes, update, out, offset=0):
+    # Each finished block (one array per output array, then optionally a details dict) is written straight into its
+    # rows of the preallocated output arrays, then reported as a 'bootstrap block' stage and as progress
+    starts = offset + np.cumsum([0] + sizes[:-1])
+
+    def store(i, block, record):
+        for array, values in zip(out, block):
+            array[starts[i]:starts[i] + sizes[i]] = values
+        info = {'first': int(starts[i]), 'size': sizes[i], **(block[len(out)] if len(block) > len(out) else {})}
+        if 'failed' in info:
+            # Replicates whose fit failed, numbered across the whole run
+            info['failed'] = [int(starts[i]) + r for r in info['failed']]
+        Instrumentation.emit({'name': 'bootstrap block', **record, 'info': info})
+        update(sizes[i])
+
+    if pool is None:
+        for i, (block_seed, size) in enumerate(zip(seeds, sizes)):
+            store(i, *Instrumentation.timed(block_fn, *args, block_seed, size))
+
+    else:
+        futures = {pool.submit(_run_block, block_seed, size): i
+                   for i, (block_seed, size) in enumerate(zip(seeds, sizes))}
+        for future in as_completed(futures):
+            store(futures[future], *future.result())
+
+
+def run_bootstrap(block_fn, args, n_rep=2000, n_jobs=1, seed=None, desc=' > Getting bootstrapped results...  ',
+                  progress=True, out=None):
+    """
+    Runs block_fn(*args, seed, size) over n_rep replicates split into BLOCK_SIZE blocks, in a process pool
+    when n_jobs != 1 (-1 uses every core). Returns the (n_rep x 3) estimates, p-values and standard errors, written
+    into the preallocated out=(estimates, pvals, std_errs) arrays when given (out may hold other arrays, one per array
+    block_fn returns).
+    """
+    sizes = _block_sizes(n_rep)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    out = out if out is not None else tuple(np.empty((n_rep, 3)) for _ in range(3))
+
+    pool = process_pool(n_jobs, len(sizes), _init_worker, (block_fn, args))
+    try:
+        with Instrumentation.progress(desc, n_rep, show=progress) as update:
+            _run_blocks(pool, block_fn, args, seeds, sizes, update, out)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return out
+
+
+def percent_mediated(estimates):
+    # |ab / (c + ab)| * 100 for every row of a (n_rep x 3) estimates array
+    indirect = estimates[:, 0] * estimates[:, 2]
+    return np.abs(indirect / (estimates[:, 1] + indirect)) * 100
+
+
+def quantile_mc_se(values, q, z=1.96):
+    """
+    Distribution-free Monte Carlo standard error of the q-th bootstrap quantile (per column), from the spread of
+    the order statistics that bracket it: (x_(Bq + z*sqrt(Bq(1-q))) - x_(Bq - z*sqrt(Bq(1-q)))) / 2z.
+    """
+    values = np.sort(values, axis=0)
+    n_rep = len(values)
+    half = z * np.sqrt(n_rep * q * (1 - q))
+    lo = int(np.clip(np.floor(n_rep * q - half), 0, n_rep - 1))
+    hi = int(np.clip(np.ceil(n_rep * q + half), 0, n_rep - 1))
+    return (values[hi] - values[lo]) / (2 * z)
+
+
+def mc_errors(estimates, level=0.95):
+    """
+    Monte Carlo error of the reported bootstrap summaries: the percentile CI endpoints of the a, b, c paths and of
+    percent mediated, and the mean percent mediated. 'relative' is the MC standard error divided by the bootstrap
+    standard deviation of the same quantity, so one tolerance works across paths on very different scales.
+    """
+    tail = (1 - level) / 2
+    pct = percent_mediated(estimates)
+    values = np.column_stack([estimates[:, 0], estimates[:, 2], estimates[:, 1], pct])
+    names = ['a', 'b', 'c', 'percent_mediated']
+
+    rows = {}
+    for q, bound in [(tail, 'lower'), (1 - tail, 'upper')]:
+        est, se = np.quantile(values, q, axis=0), quantile_mc_se(values, q)
+        for j, name in enumerate(names):
+            rows[f'{name} {bound}'] = (est[j], se[j], values[:, j].std(ddof=1))
+    rows['percent_mediated mean'] = (pct.mean(), pct.std(ddof=1) / np.sqrt(len(pct)), pct.std(ddof=1))
+
+    errors = pd.DataFrame.from_dict(rows, orient='index', columns=['value', 'mc_se', 'sd'])
+    errors['relative'] = errors['mc_se'] / errors['sd']
+    return errors.drop(columns='sd')
+
+
+def bca_bounds(values, estimate, jackknife, level=0.95):
+    """
+    Bias-corrected and accelerated (BCa) interval of each column of values (n_rep x k) around the full-sample
+    estimate (k,): the bias correction z0 comes from the share of replicates below the estimate and the
+    acceleration from the skewness of the leave-one-out jackknife values (n x k). Returns (lower, upper) arrays.
+    """
+    n_rep = len(values)
+    below = ((values < estimate).sum(axis=0) + 0.5 * (values == estimate).sum(axis=0)) / n_rep
+    z0 = norm.ppf(np.clip(below, 1 / (n_rep + 1), n_rep / (n_rep + 1)))
+
+    dev = jackknife.mean(axis=0) - jackknife
+    accel = (dev ** 3).sum(axis=0) / (6 * ((dev ** 2).sum(axis=0)) ** 1.5)
+
+    bounds = []
+    for z in norm.ppf([(1 - level) / 2, (1 + level) / 2]):
+        q = norm.cdf(z0 + (z0 + z) / (1 - accel * (z0 + z)))
+        bounds.append(np.array([np.nanquantile(values[:, j], q[j]) for j in range(values.shape[1])]))
+    return tuple(bounds)
+
+
+def studentized_bounds(values, std_errs, estimate, std_err, level=0.95):
+    """
+    Bootstrap-t interval of each column of values (n_rep x k): quantiles of t* = (value - estimate) / se* over the
+    replicates, scaled by the full-sample standard error. Replicates without a finite se* are left out.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (values - estimate) / std_errs
+    t[~np.isfinite(t)] = np.nan
+    with warnings.catch_warnings():
+        # Columns with no standard errors at all give NaN bounds
+        warnings.simplefilter('ignore', RuntimeWarning)
+        t_lower, t_upper = np.nanquantile(t, [(1 - level) / 2, (1 + level) / 2], axis=0)
+    return estimate - t_upper * std_err, estimate - t_lower * std_err
+
+
+def run_adaptive_bootstrap(block_fn, args, tol=0.05, max_rep=10000, batch_rep=200, n_jobs=1, seed=None,
+                           desc=' > Getting bootstrapped results...  ', progress=True, out=None):
+    """
+    Sequential bootstrap: runs batches of batch_rep replicates until every summary tracked by mc_errors has a
+    relative MC error <= tol, or max_rep replicates are done. Blocks are seeded exactly as in run_bootstrap, so the
+    replicates are a prefix of the fixed-size run with the same seed. Returns the estimates, p-values and standard
+    errors actually run (leading rows of the (max_rep x 3) out arrays when given) and their mc_errors.
+    """
+    batch_rep = max(BLOCK_SIZE, int(np.ceil(batch_rep / BLOCK_SIZE)) * BLOCK_SIZE)
+    root = np.random.SeedSequence(seed)
+    out = out if out is not None else tuple(np.empty((max_rep, 3)) for _ in range(3))
+    done = 0
+
+    pool = process_pool(n_jobs, batch_rep // BLOCK_SIZE, _init_worker, (block_fn, args))
+    try:
+        with Instrumentation.progress(desc, max_rep, show=progress) as update:
+            while done < max_rep:
+                sizes = _block_sizes(min(batch_rep, max_rep - done))
+                _run_blocks(pool, block_fn, args, root.spawn(len(sizes)), sizes, update, out, offset=done)
+                done += sum(sizes)
+
+                errors = mc_errors(out[0][:done])
+                if errors['relative'].max() <= tol:
+                    break
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return (*(array[:done] for array in out), errors)
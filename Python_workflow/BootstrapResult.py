@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.format import open_memmap
+
+from BootstrapEngine import PATHS, bca_bounds, fit_paths, jackknife_paths, mc_errors, percent_mediated, \
+    studentized_bounds
+
+# Interval methods of ci() and effects(); bca and studentized need the full-sample fit (see attach_fit)
+INTERVALS = ['percentile', 'bca', 'studentized']
+
+# Display order used throughout main.py (the arrays keep the semopy 0: A, 1: C, 2: B column order)
+REPORT_PATHS = ['a', 'b', 'c']
+
+# The per-replicate arrays, as attributes and as the .npy file names of allocate/load/save
+ARRAYS = ['estimates', 'pvals', 'std_errs']
+
+
+class BootstrapResult:
+    """
+    Bootstrap replicates of the single mediator model as three (n_rep x 3) float64 arrays, estimates, p-values and
+    standard errors, with columns in PATHS order (0: A Path, 1: C Path, 2: B Path). Summaries are computed over
+    whole columns.
+    The arrays can be memory-mapped .npy files (see allocate/load) when n_rep is too large to keep in memory.
+    BCa and studentized intervals also use the full-sample fit and its leave-one-out jackknife (see attach_fit).
+    """
+
+    def __init__(self, estimates, pvals, std_errs):
+        self.estimates = estimates
+        self.pvals = pvals
+        self.std_errs = std_errs
+        self._mc_errors = None
+        self.full = self.full_se = self.jackknife = None
+        # Replicates left out by converged() (numbered as in the original run)
+        self.dropped = np.empty(0, dtype=int)
+
+    def __repr__(self):
+        return f"BootstrapResult(n_rep={len(self)})"
+
+    def __len__(self):
+        return self.estimates.shape[0]
+
+    @classmethod
+    def allocate(cls, n_rep, spill=None):
+        # Preallocated storage; with spill, one memory-mapped file per array: {spill}.estimates.npy, ...
+        if spill is None:
+            return cls(*(np.empty((n_rep, 3)) for _ in ARRAYS))
+        return cls(*(open_memmap(f'{spill}.{name}.npy', mode='w+', dtype=np.float64, shape=(n_rep, 3))
+                     for name in ARRAYS))
+
+    @classmethod
+    def load(cls, prefix, mmap_mode='r'):
+        return cls(*(np.load(f'{prefix}.{name}.npy', mmap_mode=mmap_mode) for name in ARRAYS))
+
+    def save(self, prefix):
+        for name in ARRAYS:
+            np.save(f'{prefix}.{name}.npy', getattr(self, name))
+
+    @property
+    def arrays(self):
+        # (estimates, pvals, std_errs), e.g. as the out arrays of BootstrapEngine.run_bootstrap
+        return tuple(getattr(self, name) for name in ARRAYS)
+
+    def head(self, n_rep):
+        # First n_rep replicates (views, no copy), e.g. after an adaptive run stopped early
+        result = BootstrapResult(*(array[:n_rep] for array in self.arrays))
+        result.full, result.full_se, result.jackknife = self.full, self.full_se, self.jackknife
+        return result
+
+    @property
+    def failed(self):
+        # Replicates whose fit did not converge (NaN rows, see SemFitter.semopy_block)
+        return np.flatnonzero(np.isnan(self.estimates).any(axis=1))
+
+    def converged(self):
+        # The replicates without failed fits (a copy), with the same full-sample fit attached
+        keep = ~np.isnan(self.estimates).any(axis=1)
+        result = BootstrapResult(*(np.asarray(array)[keep] for array in self.arrays))
+        result.full, result.full_se, result.jackknife = self.full, self.full_se, self.jackknife
+        result.dropped = np.flatnonzero(~keep)
+        return result
+
+    def attach_fit(self, x, m, y):
+        # Full-sample estimates, standard errors and n leave-one-out estimates (closed form) of the resampled data
+        self.full, self.full_se, _, _ = fit_paths(x, m, y)
+        self.jackknife = jackknife_paths(x, m, y)
+        return self
+
+    # ---- named path accessors ----
+
+    def path(self, name):
+        return self.estimates[:, PATHS.index(name)]
+
+    @property
+    def a(self):
+        return self.path('a')
+
+    @property
+    def b(self):
+        return self.path('b')
+
+    @property
+    def c(self):
+        return self.path('c')
+
+    @property
+    def indirect(self):
+        return self.a * self.b
+
+    # ---- vectorized summaries ----
+
+    def percent_mediated(self):
+        # |ab / (c + ab)| * 100 for every replicate
+        return percent_mediated(self.estimates)
+
+    def percentiles(self, q=(2.5, 97.5)):
+        values = np.percentile(self.estimates, q, axis=0)
+        return pd.DataFrame(values.T, index=PATHS, columns=list(q)).loc[REPORT_PATHS]
+
+    def _bounds(self, values, full, jackknife, std_errs, full_se, level, method):
+        # (lower, upper) of each column of values with the given interval method
+        if method == 'percentile':
+            tail = (1 - level) / 2 * 100
+            return np.percentile(values, [tail, 100 - tail], axis=0)
+        if method not in INTERVALS:
+            raise ValueError(f"Unknown interval method: {method} (expected one of {INTERVALS})")
+        if self.full is None:
+            raise ValueError(f"{method} intervals need the full-sample fit; call attach_fit(x, m, y) first.")
+        if method == 'bca':
+            return bca_bounds(values, full, jackknife, level)
+        return studentized_bounds(values, std_errs, full, full_se, level)
+
+    def ci(self, level=0.95, method='percentile'):
+        # percentile, bca or studentized intervals of the a, b and c paths
+        lower, upper = self._bounds(self.estimates, self.full, self.jackknife, self.std_errs, self.full_se, level,
+                                    method)
+        return pd.DataFrame({'Lower Bound': lower, 'Upper Bound': upper}, index=PATHS).loc[REPORT_PATHS]
+
+    def effects(self, level=0.95, method='percentile'):
+        """
+        Intervals of the indirect effect (ab), total effect (c + ab) and percent mediated. Studentized intervals
+        need a standard error per replicate, from the delta method for the indirect (sqrt(a^2 se_b^2 + b^2 se_a^2))
+        and total (sqrt(se_c^2 + a^2 se_b^2 + b^2 se_a^2)) effects; percent mediated is NaN with
+        method='studentized'.
+        """
+        def derived(estimates):
+            estimates = np.atleast_2d(estimates)
+            indirect = estimates[:, 0] * estimates[:, 2]
+            return np.column_stack([indirect, estimates[:, 1] + indirect, percent_mediated(estimates)])
+
+        def effect_se(estimates, std_errs):
+            estimates, std_errs = np.atleast_2d(estimates), np.atleast_2d(std_errs)
+            indirect_var = (estimates[:, 0] * std_errs[:, 2]) ** 2 + (estimates[:, 2] * std_errs[:, 0]) ** 2
+            return np.column_stack([np.sqrt(indirect_var), np.sqrt(std_errs[:, 1] ** 2 + indirect_var),
+                                    np.full_like(indirect_var, np.nan)])
+
+        full = jackknife = std_errs = full_se = None
+        if self.full is not None:
+            full, jackknife = derived(self.full)[0], derived(self.jackknife)
+            if method == 'studentized':
+                std_errs = effect_se(self.estimates, self.std_errs)
+                full_se = effect_se(self.full, self.full_se)[0]
+        lower, upper = self._bounds(derived(self.estimates), full, jackknife, std_errs, full_se, level, method)
+        return pd.DataFrame({'Lower Bound': lower, 'Upper Bound': upper},
+                            index=['indirect', 'total', 'percent_mediated'])
+
+    def significance(self, alpha=0.05, scale=1):
+        # Proportion of replicates with (scale * p-value) < alpha, e.g. scale = number of tests for Bonferroni
+        return pd.Series((self.pvals * scale < alpha).mean(axis=0), index=PATHS).loc[REPORT_PATHS]
+
+    def mc_errors(self):
+        if self._mc_errors is None:
+            self._mc_errors = mc_errors(self.estimates)
+        return self._mc_errors
+
+    def to_frame(self, pvals=False):
+        # Replicates as a DataFrame in the semopy layout (columns 0: A Path, 1: C Path, 2: B Path)
+        return pd.DataFrame(self.pvals if pvals else self.estimates)
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import t
+
+
+def stars(p):
+    return np.select([p < 0.001, p < 0.01, p < 0.05], ['***', '**', '*'], default='')
+
+
+def adjust_pvalues(p, method):
+    # Bonferroni or Benjamini-Hochberg ('fdr') adjustment over all tests in p
+    p = np.asarray(p, dtype=np.float64)
+    if method == 'bonferroni':
+        return np.minimum(p * len(p), 1)
+    if method == 'fdr':
+        order = np.argsort(p)
+        ranked = p[order] * len(p) / np.arange(1, len(p) + 1)
+        adjusted = np.empty_like(p)
+        adjusted[order] = np.minimum(np.minimum.accumulate(ranked[::-1])[::-1], 1)
+        return adjusted
+    raise ValueError(f"Unknown correction: {method} (expected 'fdr' or 'bonferroni')")
+
+
+def _listwise(x, y):
+    # Pearson r for every (x column, y column) pair on the rows complete in all columns
+    keep = ~(np.isnan(x).any(axis=1) | np.isnan(y).any(axis=1))
+    x, y = x[keep], y[keep]
+    n = len(x)
+    zx = (x - x.mean(axis=0)) / x.std(axis=0)
+    zy = (y - y.mean(axis=0)) / y.std(axis=0)
+    return zx.T @ zy / n, np.full((x.shape[1], y.shape[1]), n)
+
+
+def _pairwise(x, y):
+    # Pearson r for every pair on its own complete rows, from masked cross-products (one matrix product per sum)
+    mx, my = (~np.isnan(x)).astype(np.float64), (~np.isnan(y)).astype(np.float64)
+
+    # Centering by the column means does not change r but keeps the raw sums well conditioned
+    x0 = np.nan_to_num(x - np.nanmean(x, axis=0))
+    y0 = np.nan_to_num(y - np.nanmean(y, axis=0))
+
+    n = mx.T @ my
+    sx, sy = x0.T @ my, mx.T @ y0
+    sxx, syy = (x0 ** 2).T @ my, mx.T @ (y0 ** 2)
+    sxy = x0.T @ y0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sxy - sx * sy / n
+        r = cov / np.sqrt((sxx - sx ** 2 / n) * (syy - sy ** 2 / n))
+    return r, n.astype(int)
+
+
+def correlate(sample, IV, DV=None, deletion='listwise', correction=None):
+    """
+    Pearson correlations of IV (a column or list of columns) against every DV in one vectorized pass, or of all
+    pairs of IV when DV is None. deletion is 'listwise' (rows complete in every column) or 'pairwise' (rows
+    complete in each pair). Returns a tidy DataFrame: x, y, r, p, n, sig, plus p_adj when a correction
+    ('fdr' or 'bonferroni') is applied, in which case sig uses the adjusted p-values.
+    """
+    xs = [IV] if isinstance(IV, str) else list(IV)
+    ys = xs if DV is None else ([DV] if isinstance(DV, str) else list(DV))
+    frame = sample[list(dict.fromkeys(xs + ys))]
+    x, y = frame[xs].to_numpy(dtype=np.float64), frame[ys].to_numpy(dtype=np.float64)
+
+    if deletion == 'listwise':
+        r, n = _listwise(x, y)
+    elif deletion == 'pairwise':
+        r, n = _pairwise(x, y)
+    else:
+        raise ValueError(f"Unknown deletion: {deletion} (expected 'listwise' or 'pairwise')")
+
+    # Two-sided p-value of r under H0: rho = 0 (t with n - 2 degrees of freedom, as in scipy's pearsonr)
+    r = np.clip(r, -1, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = 2 * t.sf(np.abs(r) * np.sqrt((n - 2) / (1 - r ** 2)), n - 2)
+
+    i, j = np.triu_indices(len(xs), k=1) if DV is None else np.indices(r.shape).reshape(2, -1)
+    table = pd.DataFrame({'x': np.array(xs)[i], 'y': np.array(ys)[j], 'r': r[i, j], 'p': p[i, j], 'n': n[i, j]})
+
+    if correction is not None:
+        table['p_adj'] = adjust_pvalues(table['p'], correction)
+    table['sig'] = stars(table['p_adj'] if correction is not None else table['p'])
+    return table
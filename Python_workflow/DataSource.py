@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from Instrumentation import stage
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'UPDATED_DATA.csv')
+CHUNK_ROWS = 100_000
+
+
+def file_hash(path, block=1 << 20):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(block), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class DataSource:
+    """
+    Lazy, column-projected access to a CSV. Numeric columns are converted once into a memory-mapped float64
+    store (one raw file per column under cache_dir), which is rebuilt only when the CSV's mtime and content hash
+    change. Indexing works like a DataFrame but only reads the requested columns:
+    source['WISC_FSIQ'] -> Series, source[['PrimaryDx_ASD', 'WISC_FSIQ']] -> DataFrame.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, cache_dir=None):
+        self.path = os.path.abspath(path)
+        stem = os.path.splitext(os.path.basename(self.path))[0]
+        self.cache_dir = cache_dir or os.path.join(os.path.dirname(self.path), '.cache', stem)
+
+        self._columns = None
+        self._manifest = None
+        self._arrays = {}
+
+    def __repr__(self):
+        return f"DataSource({self.path})"
+
+    @property
+    def columns(self):
+        if self._columns is None:
+            self._columns = list(pd.read_csv(self.path, nrows=0).columns)
+        return self._columns
+
+    def __contains__(self, column):
+        return column in self.columns
+
+    def __len__(self):
+        return self.manifest['n_rows']
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.load([key])[key]
+        return self.load(list(key))
+
+    # ---- cache management ----
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            self._manifest = self._validate_cache()
+        if self._manifest is None:
+            with stage('build cache', path=self.path):
+                self._manifest = self._build_cache()
+        return self._manifest
+
+    def refresh(self):
+        """
+        Forgets the manifest, header and column views when the CSV changed on disk since they were read, so a
+        long-running process (see AnalysisServer) picks up the new data on its next access. Returns whether it did.
+        """
+        if self._manifest is None:
+            return False
+        stat = os.stat(self.path)
+        if self._manifest['mtime'] == stat.st_mtime and self._manifest['size'] == stat.st_size:
+            return False
+        self._manifest, self._columns, self._arrays = None, None, {}
+        return True
+
+    def _manifest_path(self):
+        return os.path.join(self.cache_dir, 'manifest.json')
+
+    def _validate_cache(self):
+        try:
+            with open(self._manifest_path()) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        stat = os.stat(self.path)
+        if manifest['mtime'] == stat.st_mtime and manifest['size'] == stat.st_size:
+            return manifest
+
+        # Touched but possibly unchanged: only the hash decides whether to rebuild
+        if manifest['sha256'] == file_hash(self.path):
+            manifest['mtime'], manifest['size'] = stat.st_mtime, stat.st_size
+            self._write_manifest(manifest)
+            return manifest
+
+        return None
+
+    def _write_manifest(self, manifest):
+        tmp = self._manifest_path() + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self._manifest_path())
+
+    def _build_cache(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        stat = os.stat(self.path)
+        files = {col: f'col_{i}.f64' for i, col in enumerate(self.columns)}
+        handles = {col: open(os.path.join(self.cache_dir, name), 'wb') for col, name in files.items()}
+        numeric = set(self.columns)
+        n_rows = 0
+
+        # One chunked pass; a column that turns out to be non-numeric in any chunk is left to the CSV reader
+        try:
+            for chunk in pd.read_csv(self.path, chunksize=CHUNK_ROWS, low_memory=False):
+                n_rows += len(chunk)
+                for col in list(numeric):
+                    if pd.api.types.is_numeric_dtype(chunk[col]):
+                        handles[col].write(chunk[col].to_numpy(dtype=np.float64).tobytes())
+                    else:
+                        numeric.discard(col)
+        finally:
+            for handle in handles.values():
+                handle.close()
+
+        for col, name in files.items():
+            if col not in numeric:
+                os.remove(os.path.join(self.cache_dir, name))
+
+        manifest = {'mtime': stat.st_mtime, 'size': stat.st_size, 'sha256': file_hash(self.path),
+                    'n_rows': n_rows, 'numeric': {col: files[col] for col in self.columns if col in numeric}}
+        self._write_manifest(manifest)
+        self._arrays = {}
+        return manifest
+
+    # ---- loading ----
+
+    def array(self, column):
+        # Read-only memory-mapped float64 view of a numeric column
+        if column not in self._arrays:
+            name = self.manifest['numeric'][column]
+            self._arrays[column] = np.memmap(os.path.join(self.cache_dir, name), dtype=np.float64, mode='r',
+                                             shape=(self.manifest['n_rows'],))
+        return self._arrays[column]
+
+    def load(self, columns=None):
+        # DataFrame with only the requested columns (all columns if None), in the requested order
+        columns = self.columns if columns is None else list(columns)
+        missing = [col for col in columns if col not in self]
+        if missing:
+            raise KeyError(f"{missing} not in {os.path.basename(self.path)}")
+
+        with stage('load', columns=len(columns)):
+            numeric = self.manifest['numeric']
+            frame = {col: np.array(self.array(col)) for col in columns if col in numeric}
+
+            text = [col for col in columns if col not in numeric]
+            if text:
+                text_frame = pd.read_csv(self.path, usecols=text, dtype=str)
+                frame.update({col: text_frame[col] for col in text})
+
+            return pd.DataFrame({col: frame[col] for col in columns})
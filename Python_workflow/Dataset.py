@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+
+from DataSource import DataSource
+from Instrumentation import stage
+
+# Set bits per byte value, for popcounts of packed masks
+_BITS = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _ados(source):
+    # ASD participants who met criteria on the ADOS, plus every non-ASD participant (the comparison group)
+    met = source['Met_on_ADOS?'].isin(['Autism', 'ASD']).to_numpy()
+    return met | (source.array('PrimaryDx_ASD') == 0)
+
+
+# Named row subsets (batch jobs' subset; main.py -d offers ados, as asd and adhd fix X = PrimaryDx_ASD): each maps the
+# DataSource to a boolean row mask
+SUBSETS = {
+    'ados': _ados,
+    'asd': lambda source: source.array('PrimaryDx_ASD') == 1,
+    'adhd': lambda source: source.array('PrimaryDx_ADHD') == 1,
+}
+
+
+def pack(mask):
+    # Boolean row mask -> packed bits, padded to whole uint64 words so masks combine 64 rows per AND
+    packed = np.packbits(mask)
+    return np.pad(packed, (0, -len(packed) % 8)).view(np.uint64)
+
+
+def popcount(bits):
+    return int(_BITS[bits.view(np.uint8)].sum(dtype=np.int64))
+
+
+class Dataset:
+    """
+    A DataSource restricted to a named row subset (see SUBSETS; None keeps every row), with a packed non-missing
+    bitmask per column, built once per column and load. Complete-case rows of any set of columns come from ANDing
+    their masks with the subset's, so row counts and dropped-row counts need no DataFrame copies. Indexing works like
+    DataSource (only the subset's rows): dataset['WISC_FSIQ'] -> Series, dataset[['PrimaryDx_ASD', 'WISC_FSIQ']] ->
+    DataFrame. Datasets made with with_subset() share the source and its masks.
+    """
+
+    def __init__(self, source=None, subset=None, subsets=SUBSETS):
+        self.source = source if source is not None else DataSource()
+        if subset is not None and subset not in subsets:
+            raise KeyError(f"Unknown subset: {subset} (expected one of {list(subsets)})")
+        self.subset = subset
+        self.subsets = subsets
+        self._masks = {}
+        self._sha = None
+
+    def __repr__(self):
+        return f"Dataset({self.source.path}, subset={self.subset})"
+
+    @property
+    def path(self):
+        return self.source.path
+
+    @property
+    def columns(self):
+        return self.source.columns
+
+    def __contains__(self, column):
+        return column in self.source
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.load([key])[key]
+        return self.load(list(key))
+
+    def with_subset(self, subset):
+        # The same data restricted to another subset, reusing the masks built so far
+        dataset = Dataset(self.source, subset, self.subsets)
+        dataset._masks, dataset._sha = self._masks, self._sha
+        return dataset
+
+    # ---- masks ----
+
+    def _cached(self, key, build):
+        # Masks are dropped whenever the source was rebuilt from a changed file
+        sha = self.source.manifest['sha256']
+        if sha != self._sha:
+            self._masks.clear()
+            self._sha = sha
+        if key not in self._masks:
+            self._masks[key] = pack(build())
+        return self._masks[key]
+
+    def column_mask(self, column):
+        # Packed non-missing bits of a column
+        if column not in self:
+            raise KeyError(f"{column} not in {self.source}")
+        if column in self.source.manifest['numeric']:
+            return self._cached(column, lambda: ~np.isnan(self.source.array(column)))
+        return self._cached(column, lambda: self.source[column].notna().to_numpy())
+
+    def subset_mask(self, subset=None):
+        # Packed bits of the subset's rows (every row when the dataset has no subset)
+        subset = self.subset if subset is None else subset
+        if subset is None:
+            return self._cached(('subset', None), lambda: np.ones(len(self.source), dtype=bool))
+        return self._cached(('subset', subset), lambda: np.asarray(self.subsets[subset](self.source), dtype=bool))
+
+    def complete(self, columns=()):
+        # Packed bits of the subset's rows that are complete on every column
+        bits = self.subset_mask().copy()
+        for column in columns:
+            bits &= self.column_mask(column)
+        return bits
+
+    def count(self, columns=()):
+        # Complete rows of the subset on columns
+        return popcount(self.complete(columns))
+
+    def dropped(self, columns):
+        # Subset rows with a missing value in any of columns
+        return self.count() - self.count(columns)
+
+    def rows(self, columns=()):
+        # Row positions (into the full file) of the subset's complete rows on columns
+        return np.flatnonzero(np.unpackbits(self.complete(columns).view(np.uint8), count=len(self.source)))
+
+    # ---- loading ----
+
+    def load(self, columns=None, complete=False):
+        # DataFrame of the subset's rows (only the complete cases on columns with complete=True), index 0..n-1
+        columns = self.columns if columns is None else list(columns)
+        if self.subset is None and not complete:
+            return self.source.load(columns)
+        missing = [col for col in columns if col not in self]
+        if missing:
+            raise KeyError(f"{missing} not in {self.source}")
+
+        rows = self.rows(columns if complete else ())
+        with stage('subset', subset=self.subset, rows=len(rows)):
+            numeric = self.source.manifest['numeric']
+            frame = {col: self.source.array(col)[rows] for col in columns if col in numeric}
+            text = [col for col in columns if col not in numeric]
+            if text:
+                text_frame = self.source.load(text)
+                frame.update({col: text_frame[col].to_numpy()[rows] for col in text})
+            return pd.DataFrame({col: frame[col] for col in columns})
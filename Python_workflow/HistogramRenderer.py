@@ -0,0 +1,143 @@
+import json
+import os
+from math import floor, ceil
+
+import numpy as np
+
+import Instrumentation
+from BootstrapEngine import process_pool
+
+
+def histogram_stats(result, M, X, Y, n_tests=1, interval='percentile'):
+    """
+    Numbers shown on the --bsplot histogram of one mediator, computed from its bootstrap (or Monte Carlo) result:
+    percent mediated summaries with its 95% interval (percentile or bca; see BootstrapResult.effects; percent
+    mediated has no studentized interval, so 'studentized' falls back to bca), significance proportions
+    (Bonferroni-scaled by n_tests) and the axis layout.
+    Returns (values, stats): the per-replicate percent mediated (%) and a JSON-serialisable dict.
+    """
+    values = result.percent_mediated()
+    p_sig_prop = result.significance(0.05, scale=n_tests)
+    mean_val, sd_val = float(np.mean(values)), float(np.std(values))
+    interval = 'bca' if interval == 'studentized' else interval
+    bounds = result.effects(method=interval).loc['percent_mediated']
+
+    stats = {'M': M, 'X': X, 'Y': Y, 'replicates': len(values), 'interval': interval,
+             'lower_bound': float(bounds['Lower Bound']), 'upper_bound': float(bounds['Upper Bound']),
+             'mean': mean_val, 'median': float(np.median(values)), 'sd': sd_val,
+             'mc_se_mean': float(result.mc_errors().loc['percent_mediated mean', 'mc_se']),
+             'p_sig': {path: float(p_sig_prop[path]) for path in ['a', 'b', 'c']}, 'n_tests': n_tests,
+             # Axis range, the shaded mean ± SD band (clipped at 0) and how close other ticks may get to its edges
+             'xlim': [floor(values.min()), ceil(values.max() / 10) * 10],
+             'shade': [max(mean_val - sd_val, 0), mean_val + sd_val],
+             'tick_threshold': float(0.2 * (values.max() - values.min()) / 100)}
+    return values, stats
+
+
+def render_histogram(values, stats, path, formats=('png',)):
+    """
+    Draws the 16x9 percent-mediation histogram from precomputed values and stats (see histogram_stats) with the
+    non-interactive Agg backend and saves it as path.<format> for each format, plus a path.json sidecar holding
+    stats. Returns the written file paths.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+    import pandas as pd
+
+    M, X, Y = stats['M'], stats['X'], stats['Y']
+    mean_val, sd_val = stats['mean'], stats['sd']
+
+    # p-value text box string
+    box_title2 = 'Percentage of Significant\nBootstrapped Estimates**: \n  ** (p < 0.05)'
+    p1 = f"- A Path --> {round(stats['p_sig']['a'] * 100, 2)}%"
+    p2 = f"- B Path --> {round(stats['p_sig']['b'] * 100, 2)}%"
+    p3 = f"- C Path --> {round(stats['p_sig']['c'] * 100, 2)}%"
+    info_p = f"{box_title2}\n\n{p1}\n{p2}\n{p3}"
+
+    # 95% interval, mean, median and replicate count text box string
+    box_title1 = f"Percent Effect of Mediation: \n  (95% {stats.get('interval', 'percentile')} interval)"
+    l1 = f"- Lower Bound: {round(stats['lower_bound'], 2)}%"
+    l2 = f"- Upper Bound: {round(stats['upper_bound'], 2)}%"
+    l3 = f"- Mean: {round(mean_val, 2)}%"
+    l4 = f"- Median: {round(stats['median'], 2)}%"
+    l5 = f"  (SD: ±{round(sd_val, 2)})"
+    l6 = f"- Replicates: {stats['replicates']}"
+    l7 = f"  (MC SE of mean: ±{round(stats['mc_se_mean'], 2)})"
+    info = f"{box_title1}\n\n{l1}\n{l2}\n\n{l3}\n{l4}\n{l5}\n\n{l6}\n{l7}"
+
+    # Creating the plot
+    fig, ax = plt.subplots(figsize=(16, 9))
+    pd.Series(values).plot.hist(bins=15, xlim=tuple(stats['xlim']), ax=ax,
+                                title=f'{M.replace("_", " ")} Mediation Effect (%) - {X} -> {Y}', density=True)
+
+    # Draw a dashed line on the histogram where the mean value is, and shade one standard deviation around it
+    ax.axvline(mean_val, color='red', linestyle='dashed', linewidth=2)
+    ax.axvspan(*stats['shade'], color='red', alpha=0.2)
+
+    # Filter out ticks that are too close to the mean or mean ± SD, then add the mean and SD ticks
+    threshold = stats['tick_threshold']
+    special_ticks = [mean_val, mean_val - sd_val, mean_val + sd_val]
+    filtered_ticks = [tick for tick in ax.get_xticks()
+                      if not any(abs(tick - special) < threshold for special in special_ticks)]
+    final_ticks = sorted(set(filtered_ticks + special_ticks))
+    ax.set_xticks(final_ticks)
+
+    # Custom labels for the mean and SD ticks, rotated and in red
+    ax.set_xticklabels([f"{tick:.2f}" if tick in special_ticks else f"{tick:.0f}" for tick in final_ticks])
+    for label in ax.get_xticklabels():
+        if label.get_text() in [f"{tick:.2f}" for tick in special_ticks]:
+            label.set_rotation(45)
+            label.set_color('red')
+
+    # Text boxes in the top right (figure coordinates); the p-value box hangs below the interval box, so the two
+    # never overlap however many lines the first one has
+    box = dict(facecolor='none', edgecolor='black')
+    info_box = fig.text(0.75, 0.85, info, ha='left', va='top', fontsize=11, bbox=box)
+    ax.annotate(info_p, xy=(0, 0), xycoords=info_box, xytext=(0, -24), textcoords='offset points', ha='left',
+                va='top', fontsize=11, bbox=box, annotation_clip=False)
+
+    written = []
+    for fmt in formats:
+        fig.savefig(f'{path}.{fmt}')
+        written.append(f'{path}.{fmt}')
+    plt.close(fig)
+
+    with open(f'{path}.json', 'w') as f:
+        json.dump(stats, f, indent=1)
+    return written + [f'{path}.json']
+
+
+def _render_job(job):
+    # Timed where it runs, so figures rendered in worker processes still show up as 'plot' stages
+    values, stats, path, formats = job
+    if isinstance(values, str):
+        values = np.load(values, mmap_mode='r')
+    return Instrumentation.timed(render_histogram, values, stats, path, formats)
+
+
+def _finished(job, result):
+    written, record = result
+    Instrumentation.emit({'name': 'plot', **record, 'info': {'M': job[1]['M']}})
+    return job[2], written
+
+
+def render_all(jobs, formats=('png',), n_jobs=1):
+    """
+    Renders every (values, stats, path) job, in a process pool when n_jobs != 1 (-1 uses every core), so the total
+    time is close to that of the slowest figure. values may be an array or the path of a saved .npy array.
+    Yields (path, written files) as figures finish, in job order.
+    """
+    jobs = [(values, stats, path, tuple(formats)) for values, stats, path in jobs]
+    for _, _, path, _ in jobs:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    pool = process_pool(n_jobs, len(jobs))
+    if pool is None:
+        for job in jobs:
+            yield _finished(job, _render_job(job))
+        return
+
+    with pool:
+        for job, result in zip(jobs, pool.map(_render_job, jobs)):
+            yield _finished(job, result)
@@ -0,0 +1,247 @@
+import hashlib
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from BootstrapEngine import PATHS, numpy_block, run_bootstrap
+from BootstrapResult import BootstrapResult
+from DataSource import DEFAULT_PATH
+from Instrumentation import stage
+from StreamingMediation import MOMENTS, _features, paths_from_sums
+
+INCREMENTAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'incremental')
+
+# Above this share of touched rows the sums are rebuilt from scratch instead of updated
+REBUILD_SHARE = 0.5
+
+
+def _prefix_hash(path, size, block=1 << 20):
+    # sha256 of the first size bytes of path
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while size > 0:
+            chunk = f.read(min(block, size))
+            if not chunk:
+                break
+            sha.update(chunk)
+            size -= len(chunk)
+    return sha.hexdigest()
+
+
+class IncrementalEstimator:
+    """
+    Single mediator fits (X -> M -> Y, complete cases per mediator) kept up to date as a data file changes. The state
+    under state_dir holds, per mediator, the MOMENTS sums of its fit (see StreamingMediation), plus the model columns
+    and a fingerprint of every row they came from. update() finds the rows added, removed or changed since the last
+    run and moves the sums by exactly those rows, so estimates, standard errors and p-values cost O(touched rows).
+    Bootstrap summaries are recomputed only for the mediators whose complete-case (x, m, y) rows changed.
+
+    Rows are matched by the key column when given (it must be unique), otherwise by position. When the file only grew
+    and its old bytes are unchanged, only the appended bytes are parsed.
+    """
+
+    def __init__(self, mediators, X='PrimaryDx_ASD', Y='PercentAccuracy_GTI', path=DEFAULT_PATH, key=None,
+                 state_dir=None, n_rep=2000, seed=None, n_jobs=1):
+        self.path = os.path.abspath(path)
+        self.X, self.Y, self.mediators = X, Y, list(mediators)
+        self.columns = [X, Y] + self.mediators
+        self.key = key
+        self.state_dir = state_dir or os.path.join(INCREMENTAL_DIR, os.path.splitext(os.path.basename(path))[0])
+        self.n_rep, self.seed, self.n_jobs = n_rep, seed, n_jobs
+        self.sums, self.summaries, self.refreshed = None, {}, []
+
+    def __repr__(self):
+        return f"IncrementalEstimator({self.path}, {len(self.mediators)} mediators)"
+
+    # ---- state ----
+
+    def _load_state(self):
+        # (meta, arrays) of the last run, or (None, None) when there is none for these columns and key
+        try:
+            with open(os.path.join(self.state_dir, 'summary.json')) as f:
+                meta = json.load(f)
+            with np.load(os.path.join(self.state_dir, 'state.npz')) as arrays:
+                arrays = {name: arrays[name] for name in arrays.files}
+        except (OSError, ValueError, KeyError):
+            return None, None
+        if meta['columns'] != self.columns or meta['key'] != self.key:
+            return None, None
+        return meta, arrays
+
+    def _save_state(self, meta, arrays):
+        # Written to temporary files and renamed, so an interrupted run leaves the previous state intact
+        os.makedirs(self.state_dir, exist_ok=True)
+        tmp = os.path.join(self.state_dir, 'state.tmp.npz')
+        np.savez(tmp, **arrays)
+        os.replace(tmp, os.path.join(self.state_dir, 'state.npz'))
+        with open(os.path.join(self.state_dir, 'summary.tmp.json'), 'w') as f:
+            json.dump(meta, f, indent=1)
+        os.replace(os.path.join(self.state_dir, 'summary.tmp.json'), os.path.join(self.state_dir, 'summary.json'))
+
+    # ---- reading ----
+
+    def _parse(self, source):
+        # Keys, model-column values and per-row fingerprints (hashes of the values) of a CSV
+        usecols = self.columns + ([self.key] if self.key else [])
+        data = pd.read_csv(source, usecols=usecols, dtype={self.key: str} if self.key else None)
+        values = data[self.columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+        hashes = pd.util.hash_pandas_object(pd.DataFrame(values), index=False).to_numpy()
+        keys = data[self.key].to_numpy(dtype=str) if self.key else np.empty(0, dtype=str)
+        return keys, values, hashes
+
+    def _read(self, meta):
+        """
+        Keys, values and hashes of every row of the current file, and the number of old rows when it was read as an
+        append (the old bytes unchanged; only the new bytes are parsed), else None.
+        """
+        size = os.path.getsize(self.path)
+        if meta is None or size < meta['size'] or _prefix_hash(self.path, meta['size']) != meta['prefix']:
+            return (*self._parse(self.path), None)
+
+        with open(self.path, 'rb') as f:
+            header = f.readline()
+            f.seek(meta['size'])
+            tail = f.read()
+        return (*self._parse(io.BytesIO(header + tail)), meta['n_rows'])
+
+    def _diff(self, old_keys, old_hashes, keys, hashes):
+        # Old rows that left (removed), changed (old index, new index) pairs and new rows that were added
+        if self.key:
+            if len(set(keys)) != len(keys):
+                raise ValueError(f"Key column {self.key} is not unique; match rows by position (key=None) instead.")
+            new_of_old = pd.Index(keys).get_indexer(old_keys)
+        else:
+            new_of_old = np.arange(len(old_hashes))
+            new_of_old[new_of_old >= len(hashes)] = -1
+
+        kept = np.flatnonzero(new_of_old >= 0)
+        removed = np.flatnonzero(new_of_old < 0)
+        changed = kept[old_hashes[kept] != hashes[new_of_old[kept]]]
+        added = np.setdiff1d(np.arange(len(hashes)), new_of_old[kept], assume_unique=True)
+        return removed, (changed, new_of_old[changed]), added
+
+    # ---- sums ----
+
+    def _triples(self, values, j):
+        # (x, m, y) of mediator j and which rows are complete for it
+        triple = values[:, [0, 2 + j, 1]]
+        return triple, ~np.isnan(triple).any(axis=1)
+
+    def _shifts(self, values):
+        # Reference point of each mediator's sums (its complete-case means when the sums are built)
+        shifts = np.zeros((len(self.mediators), 3))
+        for j in range(len(self.mediators)):
+            triple, complete = self._triples(values, j)
+            if complete.any():
+                shifts[j] = triple[complete].mean(axis=0)
+        return shifts
+
+    def _sums(self, values, shifts):
+        sums = np.zeros((len(self.mediators), len(MOMENTS)))
+        for j in range(len(self.mediators)):
+            triple, complete = self._triples(values, j)
+            sums[j] = _features(triple[complete], shifts[j]).sum(axis=0)
+        return sums
+
+    # ---- update ----
+
+    def _bootstrap(self, values, j, progress):
+        # Percentile intervals of the paths and effects of mediator j, as stored in summary.json
+        triple, complete = self._triples(values, j)
+        x, m, y = triple[complete].T
+        result = BootstrapResult(*run_bootstrap(numpy_block, (x, m, y), n_rep=self.n_rep, n_jobs=self.n_jobs,
+                                                seed=self.seed, progress=progress,
+                                                desc=f' > Bootstrapping {self.mediators[j]}...  '))
+        bounds = pd.concat([result.ci(), result.effects()])
+        return {'n': len(x), **{f'{name} {side}': float(bounds.loc[name, f'{side.title()} Bound'])
+                                for name in bounds.index for side in ['lower', 'upper']}}
+
+    def update(self, progress=True):
+        """
+        Brings the fits up to date with the file and returns a report: the numbers of added, removed and changed
+        rows, whether the sums were rebuilt and the mediators whose bootstrap was refreshed. See table() for results.
+        """
+        meta, arrays = self._load_state()
+        with stage('incremental read') as info:
+            keys, values, hashes, n_old = self._read(meta)
+            info['rows'] = len(values)
+
+        if arrays is None:
+            old_keys, old_values, old_hashes = np.empty(0, dtype=str), np.empty((0, len(self.columns))), \
+                np.empty(0, dtype=np.uint64)
+        else:
+            old_keys, old_values, old_hashes = arrays['keys'], arrays['values'], arrays['hashes']
+
+        if n_old is not None:
+            # Appended rows only: the old rows are unchanged, so there is nothing to compare
+            keys = np.concatenate([old_keys, keys])
+            values, hashes = np.concatenate([old_values, values]), np.concatenate([old_hashes, hashes])
+            if self.key and len(set(keys)) != len(keys):
+                raise ValueError(f"Key column {self.key} is not unique; match rows by position (key=None) instead.")
+            removed, changed, added = np.empty(0, int), (np.empty(0, int), np.empty(0, int)), np.arange(n_old,
+                                                                                                        len(values))
+        else:
+            removed, changed, added = self._diff(old_keys, old_hashes, keys, hashes)
+
+        # Old versions of the touched rows leave the sums and new versions enter them, aligned row for row (NaN
+        # rows stand for "no row", which is never a complete case)
+        missing_row = np.full((1, len(self.columns)), np.nan)
+        leaving = np.concatenate([old_values[removed], old_values[changed[0]], missing_row.repeat(len(added), 0)])
+        entering = np.concatenate([missing_row.repeat(len(removed), 0), values[changed[1]], values[added]])
+
+        rebuild = arrays is None or len(leaving) > REBUILD_SHARE * max(len(values), 1)
+        with stage('incremental sums', rows=len(leaving), rebuild=rebuild):
+            if rebuild:
+                shifts = self._shifts(values)
+                sums = self._sums(values, shifts)
+            else:
+                shifts = arrays['shifts']
+                sums = arrays['sums'] + self._sums(entering, shifts) - self._sums(leaving, shifts)
+
+        # A bootstrap is stale when its settings changed or a touched row changed the mediator's complete-case rows
+        settings = {'n_rep': self.n_rep, 'seed': self.seed}
+        summaries = meta['bootstrap'] if meta is not None and meta['settings'] == settings else {}
+        refreshed = []
+        for j, mediator in enumerate(self.mediators):
+            old_triple, old_complete = self._triples(leaving, j)
+            new_triple, new_complete = self._triples(entering, j)
+            moved = (old_complete | new_complete) & ~np.all((old_triple == new_triple) | np.isnan(old_triple)
+                                                            & np.isnan(new_triple), axis=1)
+            if rebuild or mediator not in summaries or moved.any():
+                refreshed.append(mediator)
+                summaries[mediator] = self._bootstrap(values, j, progress)
+
+        size = os.path.getsize(self.path)
+        self._save_state({'columns': self.columns, 'key': self.key, 'size': size,
+                          'prefix': _prefix_hash(self.path, size), 'n_rows': len(values), 'settings': settings,
+                          'bootstrap': summaries},
+                         {'keys': keys, 'values': values, 'hashes': hashes, 'sums': sums, 'shifts': shifts})
+        self.sums, self.summaries, self.refreshed = sums, summaries, refreshed
+
+        return {'rows': len(values), 'added': len(added), 'removed': len(removed), 'changed': len(changed[0]),
+                'rebuilt': rebuild, 'refreshed': refreshed}
+
+    def table(self):
+        """
+        One row per mediator: complete-case n, the a, b and c estimates, standard errors and p-values, the indirect
+        effect with its bootstrap 95% interval, and whether the last update() refreshed its bootstrap.
+        """
+        if self.sums is None:
+            raise ValueError("No results yet; call update() first.")
+
+        est, se, p, _ = paths_from_sums(self.sums)
+        rows = []
+        for j, mediator in enumerate(self.mediators):
+            summary = self.summaries[mediator]
+            row = {'n': int(self.sums[j, 0])}
+            for name in ['a', 'b', 'c']:
+                k = PATHS.index(name)
+                row.update({name: est[j, k], f'{name} SE': se[j, k], f'{name} p': p[j, k]})
+            row.update({'indirect': est[j, PATHS.index('a')] * est[j, PATHS.index('b')],
+                        'indirect lower': summary['indirect lower'], 'indirect upper': summary['indirect upper'],
+                        'refreshed': mediator in self.refreshed})
+            rows.append(row)
+        return pd.DataFrame(rows, index=pd.Index(self.mediators, name='M'))
@@ -0,0 +1,144 @@
+import json
+import os
+from contextlib import contextmanager
+from time import perf_counter, process_time, time
+
+import pandas as pd
+
+# Observers notified of every stage and progress update (see Observer); empty by default
+observers = []
+
+# Names of the stages currently open in this process, outermost first
+_open_stages = []
+
+
+class Observer:
+    """
+    Base class for instrumentation observers; override any hook. A stage record is a dict with name, start (epoch
+    seconds), wall and cpu (seconds), pid, depth (nesting level) and info (stage details such as iterations or
+    convergence).
+    """
+
+    def stage_started(self, name, info):
+        pass
+
+    def stage_finished(self, record):
+        pass
+
+    def progress_started(self, name, total):
+        pass
+
+    def progress(self, name, n):
+        pass
+
+    def progress_finished(self, name):
+        pass
+
+
+class ProgressBar(Observer):
+    # tqdm bar for progress updates (the bootstrap replicate counter)
+
+    def __init__(self):
+        self.bars = {}
+
+    def progress_started(self, name, total):
+        from tqdm import tqdm
+        self.bars[name] = tqdm(total=total, desc=name)
+
+    def progress(self, name, n):
+        self.bars[name].update(n)
+
+    def progress_finished(self, name):
+        self.bars.pop(name).close()
+
+
+class Profiler(Observer):
+    """
+    Collects every finished stage; summary() aggregates them per stage name, save() writes the records and summary as
+    JSON and save_trace() writes a Chrome trace (chrome://tracing or Perfetto) with one event per stage.
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def stage_finished(self, record):
+        self.records.append(record)
+
+    def summary(self):
+        if not self.records:
+            return pd.DataFrame(columns=['count', 'wall', 'cpu', 'iterations', 'not_converged'])
+        frame = pd.DataFrame([{'name': r['name'], 'wall': r['wall'], 'cpu': r['cpu'],
+                               'iterations': r['info'].get('iterations'),
+                               'not_converged': r['info'].get('not_converged')} for r in self.records])
+        def total(values):
+            # Iteration and convergence totals stay empty for stages that do not report them
+            return values.sum(min_count=1)
+
+        summary = frame.groupby('name', sort=False).agg(count=('wall', 'size'), wall=('wall', 'sum'),
+                                                        cpu=('cpu', 'sum'), iterations=('iterations', total),
+                                                        not_converged=('not_converged', total))
+        return summary.sort_values('wall', ascending=False)
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({'records': self.records, 'summary': self.summary().reset_index().to_dict('records')}, f,
+                      indent=1, default=str)
+
+    def save_trace(self, path):
+        events = [{'name': r['name'], 'ph': 'X', 'ts': r['start'] * 1e6, 'dur': r['wall'] * 1e6, 'pid': r['pid'],
+                   'tid': r['pid'], 'args': {'cpu': r['cpu'], **r['info']}} for r in self.records]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, default=str)
+
+
+def emit(record):
+    # Reports a finished stage (also used for stages timed in worker processes)
+    record.setdefault('depth', len(_open_stages))
+    for observer in observers:
+        observer.stage_finished(record)
+
+
+@contextmanager
+def stage(name, **info):
+    """
+    Times the enclosed block as a stage (wall and CPU time) and reports it to the observers. Yields the stage's info
+    dict so the block can add details, e.g. info['iterations'] = result.n_it.
+    """
+    record = {'name': name, 'start': time(), 'pid': os.getpid(), 'depth': len(_open_stages), 'info': info}
+    for observer in observers:
+        observer.stage_started(name, info)
+    _open_stages.append(name)
+    wall, cpu = perf_counter(), process_time()
+    try:
+        yield info
+    finally:
+        record['wall'], record['cpu'] = perf_counter() - wall, process_time() - cpu
+        _open_stages.pop()
+        emit(record)
+
+
+def timed(fn, *args):
+    # Runs fn(*args) and returns its result with a stage record (for work done outside the observers' process)
+    record = {'start': time(), 'pid': os.getpid()}
+    wall, cpu = perf_counter(), process_time()
+    result = fn(*args)
+    record['wall'], record['cpu'] = perf_counter() - wall, process_time() - cpu
+    return result, record
+
+
+@contextmanager
+def progress(name, total, show=True):
+    # Yields an update(n) callback that reports progress to the observers (and to a tqdm bar when show)
+    listeners = observers + ([ProgressBar()] if show else [])
+    for observer in listeners:
+        observer.progress_started(name, total)
+
+    def update(n):
+        for observer in listeners:
+            observer.progress(name, n)
+
+    try:
+        yield update
+    finally:
+        for observer in listeners:
+            observer.progress_finished(name)
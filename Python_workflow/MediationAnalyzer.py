@@ -1,13 +1,21 @@
 import numpy as np
-from scipy.stats import pearsonr
-from semopy import Model
-import pandas as pd
 from time import sleep
-import statsmodels.api as sm
-from statsmodels.stats.mediation import Mediation
-from tqdm import tqdm
 
-data = pd.read_csv('UPDATED_DATA.csv')
+import BootstrapEngine
+from BootstrapResult import ARRAYS, BootstrapResult
+from CorrelationEngine import correlate
+import MonteCarlo
+from MultiMediation import JointModel, joint_bootstrap
+import NativeMediation
+import Sensitivity
+from Dataset import Dataset
+from Instrumentation import stage
+from ResultCache import data_fingerprint
+from SemFitter import SemFitter, semopy_block
+
+# Nothing is read at import; analyses pull only the columns they need (see DataSource), and complete cases come
+# from per-column missingness bitmasks (see Dataset)
+data = Dataset()
 variables = ['Brf_P_Init_T',
              'Brf_P_PlnOrg_T',
              'ADHD_Inattention_Composite_Score',
@@ -21,83 +29,148 @@ variables = ['Brf_P_Init_T',
              'Motor_Composite_Score']
 
 class Correlations:
-    data = data.copy()
-    # asd_data = asd_data.copy()
+    data = data
 
-    def __init__(self, IV: str, DV: list, dt=data):
+    def __init__(self, IV: str, DV: list, dt=data, deletion='listwise'):
         self.X = IV
         self.Y = DV
-        self.data = dt.loc[:, self.Y + [self.X]]
-        self.data.dropna(inplace=True)
-
-    def descriptive_statistics(self):
-        print(f"\nCorrelations for {self.X} (n = {len(self.data.index)}):")
-        for var in self.Y:
-            corr = pearsonr(self.data[self.X], self.data[var])
-            if corr[1] < 0.001:
-                sig = '***'
-            elif corr[1] < 0.01:
-                sig = '**'
-            elif corr[1] < 0.05:
-                sig = '*'
-            else:
-                sig = ''
-            print(f">>> {self.X} vs. {var}: r = {round(corr[0], 3)}, p = {round(corr[1], 3)}{sig}")
+        self.deletion = deletion
+        if deletion == 'listwise' and isinstance(dt, Dataset):
+            self.data = dt.load(self.Y + [self.X], complete=True)
+        else:
+            self.data = dt[self.Y + [self.X]]
+            if deletion == 'listwise':
+                self.data = self.data.dropna()
+
+    def descriptive_statistics(self, correction=None):
+        table = correlate(self.data, self.X, self.Y, deletion=self.deletion, correction=correction)
+        p_col = 'p' if correction is None else 'p_adj'
+
+        if self.deletion == 'listwise':
+            print(f"\nCorrelations for {self.X} (n = {len(self.data.index)}):")
+        else:
+            print(f"\nCorrelations for {self.X} (pairwise complete):")
+        for row in table.itertuples():
+            n = f" (n = {row.n})" if self.deletion != 'listwise' else ''
+            print(f">>> {self.X} vs. {row.y}: r = {round(row.r, 3)}, p = {round(getattr(row, p_col), 3)}{row.sig}{n}")
+        return table
 
 
 class MediationAnalyzer:
-    data = data.copy()
-    # asd_data = asd_data.copy()
+    data = data
+    # Optional ResultCache shared by all instances; fits and bootstraps found in it are not rerun
+    cache = None
 
-    def __init__(self, M, M2=None, M3=None, X='PrimaryDx_ASD', Y='PercentAccuracy_GTI', sample=data):
+    def __init__(self, M, M2=None, M3=None, X='PrimaryDx_ASD', Y='PercentAccuracy_GTI', sample=data, quiet=False):
         self.M = M
         self.M2 = M2
         self.M3 = M3
         self.X = X
         self.Y = Y
-        self.data = sample[[self.X, self.Y, self.M]]
+        # M2/M3 join M in the joint models (analyze(model='parallel' / 'serial')); all share one complete-case sample
+        self.mediators = [var for var in [M, M2, M3] if var is not None]
+        self.sample = sample
+        self.data = sample[[self.X, self.Y] + self.mediators]
+
+        # Library mode: no printing, pauses or progress bars; analyze() results are only returned
+        self.quiet = quiet
 
-        # to be revised later when there are multiple mediators
-        self.bootstrap_pval = None
-        self.bootstrap_estimates = None
+        self.bootstrap = None  # BootstrapResult of the last analyze(model='r', bootstrap=True)
+        self.sobel = None  # Sobel test of the indirect effect, set by method='monte_carlo'
 
     def __repr__(self):
         return f"Analysis for {self.M} (IV: {self.X}, DV: {self.Y})"
 
     @classmethod
     def get_data(cls):
-        return cls.data
+        return cls.data.load()
 
-    def clean_data(self, info=True):
-        df = self.data.copy()
-        df.dropna(inplace=True)
+    def _pause(self):
+        if not self.quiet:
+            with stage('pause'):
+                sleep(1)
 
-        if info:
-            sleep(1)
-            print(f">>> {self.data.shape[0] - df.shape[0]} rows dropped for invalid results on {self.M}.")
-            sleep(1)
+    def clean_data(self, info=True):
+        with stage('clean_data', M=self.M) as details:
+            if isinstance(self.sample, Dataset):
+                # Complete cases and the dropped count straight from the missingness bitmasks
+                columns = list(self.data.columns)
+                df = self.sample.load(columns, complete=True)
+                dropped = self.sample.dropped(columns)
+            else:
+                df = self.data.dropna()
+                dropped = self.data.shape[0] - df.shape[0]
+            details['rows_dropped'] = dropped
+
+        if not df[self.X].var() > 0:
+            # e.g. a diagnostic-group subset when X is that diagnosis
+            subset = getattr(self.sample, 'subset', None)
+            raise ValueError(f"{self.X} does not vary over the {df.shape[0]} complete rows"
+                             f"{f' of subset {subset}' if subset else ''}; it cannot be the exposure.")
+
+        if info and not self.quiet:
+            self._pause()
+            print(f">>> {dropped} rows dropped for invalid results on {self.M}.")
+            self._pause()
             print(f">>> New number of subjects for this analysis: {df.shape[0]}")
             print("_________________")
 
         check_list = [df[var].isnull().any() for var in [self.M, self.M2, self.M3, self.X, self.Y] if var is not None]
 
         if sum(check_list) == 0:
-            sleep(1)
+            self._pause()
             self.data = df
 
+        elif self.quiet:
+            raise ValueError(f"Missing values remain in {self.M} after dropping incomplete rows.")
+
         else:
             print(f'Uh oh! Number of valid values for {df[self.M]}: {df[self.M].shape[0]}')
             print(f'Expected: {df[self.X].shape[0]}.')
-            sleep(1)
+            self._pause()
             print('Go back and fix the problem!')
 
+    def _cache_key(self, **fields):
+        return self.cache.key(data=data_fingerprint(self.data), X=self.X, Y=self.Y, M=self.M, **fields)
+
+    def _fitter(self):
+        # semopy fits of the single mediator model; the model itself is compiled once per process for all mediators
+        return SemFitter({'X': self.X, 'M': self.M, 'Y': self.Y})
+
+    def _inspect(self, engine='semopy'):
+        # Full-sample fit of the single mediator model, as a semopy inspect() table
+        key = self._cache_key(kind='inspect', engine=engine) if self.cache is not None else None
+        if key is not None:
+            cached = self.cache.get_table(key)
+            if cached is not None:
+                return cached
+
+        if engine == 'numpy':
+            with stage('fit', engine='numpy'):
+                x, m, y = (self.data[var].to_numpy(dtype=np.float64) for var in [self.X, self.M, self.Y])
+                table = BootstrapEngine.inspect_table(self.X, self.Y, self.M, x, m, y)
+        else:
+            with stage('model'):
+                fitter = self._fitter()
+            with stage('fit', engine='semopy') as details:
+                result = fitter.fit_data(self.data)
+                details.update(iterations=result.n_it, not_converged=int(not result.success), objective=result.fun)
+            with stage('inspect'):
+                table = fitter.inspect()
+
+        if key is not None:
+            self.cache.put_table(key, table)
+        return table
+
     def corr(self):
-        corr1 = pearsonr(self.data[self.X], self.data[self.M])
-        corr2 = pearsonr(self.data[self.M], self.data[self.Y])
+        table = correlate(self.data, [self.X, self.M, self.Y])
+        r = table.set_index(['x', 'y'])
+        corr1 = r.loc[(self.X, self.M)]
+        corr2 = r.loc[(self.M, self.Y)]
         print('')
         print("Correlations:")
-        print(f">>> {self.X} vs. {self.M}: r = {round(corr1[0], 3)}, p = {round(corr1[1], 3)}")
-        print(f">>> {self.M} vs. {self.Y}: r = {round(corr2[0], 3)}, p = {round(corr2[1], 3)}")
+        print(f">>> {self.X} vs. {self.M}: r = {round(corr1.r, 3)}, p = {round(corr1.p, 3)}")
+        print(f">>> {self.M} vs. {self.Y}: r = {round(corr2.r, 3)}, p = {round(corr2.p, 3)}")
         print('')
 
     def descriptive_stats(self):
@@ -126,89 +199,165 @@ class MediationAnalyzer:
             print('')
         print(f">>> Cohen's d = {round(cohens_d(), 3)}\n")
 
-    def analyze(self, model, bootstrap=False):
-        if model == 'sm':
-            # Outcome model: Outcome ~ Mediator + Predictor
-            outcome_model = sm.OLS.from_formula(f"{self.Y} ~ {self.M} + {self.X}", data=self.data)
-
-            # Mediator model: Mediator ~ Predictor
-            mediator_model = sm.OLS.from_formula(f"{self.M} ~ {self.X}", data=self.data)
-
-            # Mediation: includes both the mediator and outcome model
-            med = Mediation(outcome_model, mediator_model, f"{self.X}", f"{self.M}")
+    def analyze(self, model, bootstrap=False, engine='semopy', n_rep=2000, n_jobs=1, seed=None, tol=None,
+                spill=None, method='bootstrap'):
+        if model == 'sm' and engine == 'numpy':
+            # Same bootstrap as statsmodels' Mediation below, on pre-built design matrices with the OLS refits of all
+            # replicates batched: outcome exog [1, M, X], mediator exog [1, X]
+            x, m, y = (self.data[var].to_numpy(dtype=np.float64) for var in [self.X, self.M, self.Y])
+            ones = np.ones_like(x)
+            with stage('bootstrap', engine='numpy', model='sm', n_rep=n_rep):
+                summary = NativeMediation.bootstrap_mediation(np.column_stack([ones, m, x]),
+                                                              np.column_stack([ones, x]), y, m, exp_outcome=2,
+                                                              med_outcome=1, exp_mediator=1, n_rep=n_rep, seed=seed)
+            if not self.quiet:
+                print(summary)
+            return summary
+
+        elif model == 'sm':
+            # statsmodels.api and Mediation are only imported on this path (semopy, loaded when a semopy model is
+            # first fitted, imports only statsmodels.stats); with -e numpy neither package is imported
+            import statsmodels.api as sm
+            from statsmodels.stats.mediation import Mediation
+
+            with stage('model'):
+                # Outcome model: Outcome ~ Mediator + Predictor
+                outcome_model = sm.OLS.from_formula(f"{self.Y} ~ {self.M} + {self.X}", data=self.data)
+
+                # Mediator model: Mediator ~ Predictor
+                mediator_model = sm.OLS.from_formula(f"{self.M} ~ {self.X}", data=self.data)
+
+                # Mediation: includes both the mediator and outcome model
+                med = Mediation(outcome_model, mediator_model, f"{self.X}", f"{self.M}")
 
             # Arguments include number of bootstrap samples and confidence intervals
-            med_result = med.fit(n_rep=2000, method='bootstrap')
+            with stage('bootstrap', engine='statsmodels', model='sm', n_rep=n_rep):
+                med_result = med.fit(n_rep=n_rep, method='bootstrap')
 
             # Print the result
-            print(med_result.summary())
+            with stage('summary'):
+                summary = med_result.summary()
+            if not self.quiet:
+                print(summary)
+            return summary
 
         elif model == 'r':
-            model_spec = f"""
-                        # Direct effects
-                        {self.Y} ~ c*{self.X}
-                        {self.M} ~ a*{self.X}
-
-                        # Indirect effects
-                        {self.Y} ~ b*{self.M}
-                        """
-
-            model = Model(model_spec)
-            if bootstrap:
-                # np.random.seed(42)
-                bootstrap_samples = 2000
-
-                # A list to store the results of each bootstrap sample
-                bootstrap_estimates = []
-                bootstrap_pvals = []
-                print(f'>>> Running boostrap for {self.M}:')
-                sleep(1)
-                print('')
-                for _ in tqdm(range(bootstrap_samples), desc=' > Getting bootstrapped results...  '):
-                    # Generate a bootstrap sample (a sample with replacement from your data)
-                    bootstrap_data = self.data.sample(n=len(self.data), replace=True)
-
-                    # Fit the SEM to the bootstrap sample
-                    model.fit(bootstrap_data)
-
-                    # Store the parameter estimates
-                    results = model.inspect()
-                    # if all(results.Estimate[0:3]) < 100:
-                    bootstrap_estimates.append(results.Estimate[0:3])  # 0: A Path, 1: C Path, 2: B Path
-                    bootstrap_pvals.append(results['p-value'][0:3])  # 0: A Path, 1: C Path, 2: B Path
-
-                self.bootstrap_pval = bootstrap_pvals
-                self.bootstrap_estimates = bootstrap_estimates
+            if bootstrap and method == 'monte_carlo':
+                if tol is not None:
+                    raise ValueError("tol (adaptive bootstrap) is not supported with method='monte_carlo'.")
+                # Parametric alternative: n_rep draws of (a, c, b) from the joint normal of the closed-form full-sample
+                # fit, in the same layout as bootstrap replicates
+                with stage('monte carlo', n_rep=n_rep):
+                    x, m, y = (self.data[var].to_numpy(dtype=np.float64) for var in [self.X, self.M, self.Y])
+                    estimates, cov = MonteCarlo.path_covariance(x, m, y)
+                    self.sobel = MonteCarlo.sobel_test(estimates, cov)
+                    self.bootstrap = BootstrapResult(*MonteCarlo.monte_carlo_draws(estimates, cov, n_rep, seed))
+                return self.bootstrap
+
+            elif bootstrap:
+                # Unseeded bootstraps are meant to differ between runs, so they are neither read from nor written to
+                # the cache
+                key = self._cache_key(kind='bootstrap', engine=engine, n_rep=n_rep, seed=seed, tol=tol) \
+                    if self.cache is not None and seed is not None else None
+                cached = self.cache.get(key) if key is not None else None
+
+                if cached is not None:
+                    result = BootstrapResult(*(cached[name] for name in ARRAYS))
+                else:
+                    if engine == 'numpy':
+                        # Closed-form OLS solution of the same model, batched over all bootstrap replicates
+                        x, m, y = (self.data[var].to_numpy(dtype=np.float64) for var in [self.X, self.M, self.Y])
+                        block_fn, block_args = BootstrapEngine.numpy_block, (x, m, y)
+                    else:
+                        # Every replicate is fitted from its covariance matrix, warm-started from the full-sample
+                        # solution
+                        fitter = self._fitter()
+                        with stage('fit', engine='semopy') as details:
+                            fit = fitter.fit_data(self.data)
+                            details.update(iterations=fit.n_it, not_converged=int(not fit.success))
+                        block_fn = semopy_block
+                        block_args = (fitter.names, fitter.spec, fitter.values(self.data), fitter.start())
+
+                    # Replicates are split into blocks with their own SeedSequence streams, so the same seed gives
+                    # the same estimates for any n_jobs; blocks are written straight into preallocated arrays
+                    # (memory-mapped .npy files under the spill prefix, if given)
+                    if not self.quiet:
+                        print(f'>>> Running boostrap for {self.M}:')
+                        print('')
+                    result = BootstrapResult.allocate(n_rep, spill=spill)
+                    with stage('bootstrap', engine=engine, model='r', n_rep=n_rep, n_jobs=n_jobs) as details:
+                        if tol is None:
+                            BootstrapEngine.run_bootstrap(block_fn, block_args, n_rep=n_rep, n_jobs=n_jobs, seed=seed,
+                                                          progress=not self.quiet, out=result.arrays)
+                        else:
+                            # Adaptive: stop once the MC error of the reported intervals is below tol (n_rep is the
+                            # cap)
+                            estimates, *_ = BootstrapEngine.run_adaptive_bootstrap(block_fn, block_args, tol=tol,
+                                                                                   max_rep=n_rep, n_jobs=n_jobs,
+                                                                                   seed=seed, progress=not self.quiet,
+                                                                                   out=result.arrays)
+                            result = result.head(len(estimates))
+                        details['replicates'] = len(result)
+
+                    if key is not None:
+                        self.cache.put(key, **dict(zip(ARRAYS, result.arrays)))
+
+                failed = result.failed
+                if len(failed):
+                    # Replicates whose fit failed even from a cold start are reported and left out of every summary
+                    if not self.quiet:
+                        print(f'!!! {len(failed)} of {len(result)} bootstrap fits did not converge and were left out '
+                              f'(replicates {", ".join(map(str, failed[:10]))}{", ..." if len(failed) > 10 else ""})')
+                    result = result.converged()
+
+                # Full-sample fit and closed-form jackknife for BCa / studentized intervals (O(n), no refits)
+                with stage('jackknife'):
+                    result.attach_fit(*(self.data[var].to_numpy(dtype=np.float64) for var in [self.X, self.M, self.Y]))
+                self.bootstrap = result
+                return result
 
             else:
-                model.fit(self.data)
-
-                return model.inspect()  # use with variable assignment to access values
+                return self._inspect(engine)  # use with variable assignment to access values
+
+        elif model in ['parallel', 'serial']:
+            # Joint model of all mediators (M, M2, M3), estimated equation by equation in closed form; the bootstrap
+            # refits the whole design on each resample so every effect comes from the same replicates
+            joint = JointModel(self.X, self.Y, self.mediators, serial=model == 'serial')
+            if not bootstrap:
+                with stage('fit', engine='numpy', model=model):
+                    return joint.inspect(joint.values(self.data))
+            if tol is not None:
+                raise ValueError("tol (adaptive bootstrap) is only supported for the single mediator model.")
+
+            if not self.quiet:
+                print(f'>>> Running joint {model} bootstrap for {", ".join(self.mediators)}:')
+                print('')
+            with stage('bootstrap', engine='numpy', model=model, n_rep=n_rep, n_jobs=n_jobs):
+                return joint_bootstrap(joint, self.data, n_rep=n_rep, n_jobs=n_jobs, seed=seed,
+                                       progress=not self.quiet)
 
         elif model == 'md':
-            model_spec = f"""
-                        # Direct effects
-                        {self.Y} ~ c*{self.X}
-                        {self.M} ~ a*{self.X}
-
-                        # Indirect effects
-                        {self.Y} ~ b*{self.M}
-                    """
-
-            model = Model(model_spec)
-            model.fit(self.data)
-
             # DataFrame to access results for markdown
-            model_df = model.inspect()
+            model_df = self._inspect(engine)
+            if self.quiet:
+                return model_df
 
             for i in range(3):
-                sleep(1)
+                self._pause()
                 print('')
                 print(f"{model_df.iloc[i]['rval']} --> {model_df.iloc[i]['lval']}")
                 print(
                     f"Estimate: {round(model_df.iloc[i]['Estimate'], 3)} (p = {round(model_df.iloc[i]['p-value'], 3)})")
             print('______________')
             print('')
+            return model_df
+
+    def sensitivity(self, rho=Sensitivity.RHO_GRID, level=0.95):
+        # ACME over the rho grid and the rho where it is 0 (see Sensitivity.sensitivity); intervals from the last
+        # bootstrap's replicates, else the delta method
+        x, m, y = (self.data[var].to_numpy(dtype=np.float64) for var in [self.X, self.M, self.Y])
+        with stage('sensitivity', points=len(rho), replicates=len(self.bootstrap) if self.bootstrap else 0):
+            return Sensitivity.sensitivity(x, m, y, rho, bootstrap=self.bootstrap, level=level)
 
     @staticmethod
     def percent_mediated(df):
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from BootstrapEngine import paths_from_moments
+
+COLUMNS = ['mediator', 'n', 'a', 'b', 'c', 'indirect', 'total', 'percent_mediated', 'p_a', 'p_b', 'p_c']
+
+
+def sweep(sample, mediators, X='PrimaryDx_ASD', Y='PercentAccuracy_GTI', std_errs=False):
+    """
+    Fits X -> M -> Y for every mediator in one pass and returns a tidy table (one row per mediator).
+    Mediators sharing the same complete-case rows are solved together: X and Y are subset and centered once
+    per row set, and the a/b/c paths for the whole group come from one broadcast closed-form solve.
+    std_errs=True adds the paths' standard errors (se_a, se_b, se_c).
+    """
+    x = sample[X].to_numpy(dtype=np.float64)
+    y = sample[Y].to_numpy(dtype=np.float64)
+    med = sample[mediators].to_numpy(dtype=np.float64)
+
+    # Complete-case rows per mediator, then one group per distinct row set
+    # (keyed on the packed row mask; np.unique(axis=0) builds one record field per row, which is slow for large n)
+    valid = ~np.isnan(med) & ~(np.isnan(x) | np.isnan(y))[:, None]
+    groups = {}
+    for col in range(len(mediators)):
+        groups.setdefault(np.packbits(valid[:, col]).tobytes(), []).append(col)
+
+    rows = [None] * len(mediators)
+    for cols in groups.values():
+        rows_mask = valid[:, cols[0]]
+        n = int(rows_mask.sum())
+
+        # X/Y-only work, shared by every mediator in the group
+        xc = x[rows_mask] - x[rows_mask].mean()
+        yc = y[rows_mask] - y[rows_mask].mean()
+        sxx, sxy, syy = xc @ xc, xc @ yc, yc @ yc
+        if not sxx > 0:
+            raise ValueError(f"{X} does not vary over the {n} complete rows of {mediators[cols[0]]}; it cannot be the "
+                             f"exposure.")
+
+        mc = med[rows_mask][:, cols]
+        mc = mc - mc.mean(axis=0)
+        estimates, errors, pvals, _ = paths_from_moments(sxx, xc @ mc, sxy, (mc * mc).sum(axis=0), mc.T @ yc, syy, n)
+
+        for j, col in enumerate(cols):
+            a, c, b = estimates[j]
+            rows[col] = {'mediator': mediators[col], 'n': n, 'a': a, 'b': b, 'c': c,
+                         'indirect': a * b, 'total': c + a * b,
+                         'percent_mediated': abs(a * b / (c + a * b)) * 100,
+                         'p_a': pvals[j, 0], 'p_b': pvals[j, 2], 'p_c': pvals[j, 1],
+                         'se_a': errors[j, 0], 'se_b': errors[j, 2], 'se_c': errors[j, 1]}
+
+    return pd.DataFrame(rows, columns=COLUMNS + (['se_a', 'se_b', 'se_c'] if std_errs else []))
@@ -0,0 +1,39 @@
+import numpy as np
+from scipy.stats import norm
+
+from BootstrapEngine import cross_products, paths_from_moments
+
+
+def path_covariance(x, m, y):
+    """
+    Full-sample a, c, b estimates (PATHS order) and their 3 x 3 ML sampling covariance. a comes from the mediator
+    model and (c, b) from the outcome model, so the only off-diagonal term is cov(c, b).
+    """
+    x, m, y = (np.asarray(v, dtype=np.float64) for v in (x, m, y))
+    sxx, sxm, sxy, smm, smy, syy = cross_products(x, m, y)
+    estimates, std_errs, _, resid = paths_from_moments(sxx, sxm, sxy, smm, smy, syy, len(x))
+
+    cov = np.diag(std_errs ** 2)
+    cov[1, 2] = cov[2, 1] = -resid[1] * sxm / (sxx * smm - sxm ** 2)
+    return estimates, cov
+
+
+def monte_carlo_draws(estimates, cov, n_draws=200_000, seed=None):
+    """
+    Parametric (Monte Carlo) alternative to the bootstrap: n_draws (a, c, b) vectors from the joint normal of the
+    full-sample estimates, drawn in one call. Standard errors (and so p-values) of each draw are the full-sample ones,
+    so the result has the same layout as bootstrap replicates: draws, p-values, standard errors.
+    """
+    rng = np.random.default_rng(seed)
+    draws = rng.multivariate_normal(estimates, cov, size=n_draws, method='cholesky')
+    std_errs = np.tile(np.sqrt(np.diag(cov)), (n_draws, 1))
+    pvals = 2 * norm.sf(np.abs(draws / std_errs))
+    return draws, pvals, std_errs
+
+
+def sobel_test(estimates, cov):
+    # First-order delta-method test of the indirect effect ab
+    a, b = estimates[0], estimates[2]
+    se = np.sqrt(b ** 2 * cov[0, 0] + a ** 2 * cov[2, 2])
+    z = a * b / se
+    return {'indirect': a * b, 'se': se, 'z': z, 'p': 2 * norm.sf(abs(z))}
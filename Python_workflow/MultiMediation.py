@@ -0,0 +1,176 @@
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from BootstrapEngine import batched_ols, resample_counts, run_bootstrap
+
+
+class JointModel:
+    """
+    Joint mediation model with up to three mediators, estimated equation by equation with OLS (the ML fit of the
+    saturated recursive path model). Parallel: every mediator on X, Y on X and all mediators. Serial
+    (X -> M1 -> M2 -> ... -> Y): each mediator also on the mediators before it.
+
+    Path names: a{i} (X -> Mi), d{i}{j} (Mj -> Mi, serial only), b{i} (Mi -> Y) and c (direct X -> Y). Effects:
+    one specific indirect effect per chain of mediators (ind1, ind12, ...), total_indirect, total and the pairwise
+    contrasts of the specific indirect effects.
+    """
+
+    def __init__(self, X, Y, mediators, serial=False):
+        self.X, self.Y = X, Y
+        self.mediators = list(mediators)
+        self.serial = serial
+        k = len(self.mediators)
+
+        # (outcome, predictors) per equation, variables as positions in [X, M1, ..., Mk, Y]
+        self.equations = [(i, [0] + (list(range(1, i)) if serial else [])) for i in range(1, k + 1)]
+        self.equations.append((k + 1, list(range(k + 1))))
+
+        # Path name -> (predictor, outcome) positions
+        self.path_ends = {self._path_name(outcome, predictor, k): (predictor, outcome)
+                          for outcome, predictors in self.equations for predictor in predictors}
+        self.paths = list(self.path_ends)
+
+        # Every ordered chain of mediators X -> Mi -> ... -> Mj -> Y (single mediators only when parallel)
+        lengths = range(1, k + 1) if serial else [1]
+        self.chains = [chain for length in lengths for chain in combinations(range(1, k + 1), length)]
+        self.indirect = ['ind' + ''.join(map(str, chain)) for chain in self.chains]
+        self.contrasts = [f'{first} - {second}' for first, second in combinations(self.indirect, 2)]
+        self.effects = self.indirect + ['total_indirect', 'total'] + self.contrasts
+        self.columns = self.paths + self.effects
+
+    def __repr__(self):
+        return f"JointModel({'serial' if self.serial else 'parallel'}, X={self.X}, M={self.mediators}, Y={self.Y})"
+
+    @staticmethod
+    def _path_name(outcome, predictor, k):
+        if predictor == 0:
+            return 'c' if outcome == k + 1 else f'a{outcome}'
+        return f'b{predictor}' if outcome == k + 1 else f'd{outcome}{predictor}'
+
+    def values(self, data):
+        # Model variables as an (n x k + 2) float64 array in [X, M1, ..., Mk, Y] order
+        return data[[self.X] + self.mediators + [self.Y]].to_numpy(dtype=np.float64)
+
+    def fit(self, values, weights):
+        """
+        Path estimates, ML standard errors and p-values for every row of weights (n_rep x n resample counts; a
+        single row of ones is the full-sample fit), each (n_rep x n_paths) in self.paths order.
+        """
+        ones = np.ones((len(values), 1))
+        estimates, std_errs = [], []
+        for outcome, predictors in self.equations:
+            design = np.hstack([ones, values[:, predictors]])
+            params, _, se = batched_ols(design, values[:, outcome], weights, std_errs=True)
+            estimates.append(params[:, 1:])
+            std_errs.append(se[:, 1:])
+
+        estimates, std_errs = np.hstack(estimates), np.hstack(std_errs)
+        return estimates, std_errs, 2 * norm.sf(np.abs(estimates / std_errs))
+
+    def effect_values(self, estimates):
+        # Specific and total indirect effects, total effect and contrasts from (n_rep x n_paths) path estimates
+        path = dict(zip(self.paths, estimates.T))
+        k = len(self.mediators)
+
+        indirect = []
+        for chain in self.chains:
+            effect = path[f'a{chain[0]}'] * path[f'b{chain[-1]}']
+            for before, after in zip(chain, chain[1:]):
+                effect = effect * path[self._path_name(after, before, k)]
+            indirect.append(effect)
+
+        total_indirect = np.sum(indirect, axis=0)
+        contrasts = [first - second for first, second in combinations(indirect, 2)]
+        return np.column_stack(indirect + [total_indirect, path['c'] + total_indirect] + contrasts)
+
+    def describe(self, name):
+        # Readable variable chain of a path or specific indirect effect
+        variables = [self.X] + self.mediators + [self.Y]
+        if name in self.path_ends:
+            return ' -> '.join(variables[i] for i in self.path_ends[name])
+        if name in self.indirect:
+            chain = self.chains[self.indirect.index(name)]
+            return ' -> '.join(variables[i] for i in (0,) + chain + (len(variables) - 1,))
+        return name
+
+    def inspect(self, values):
+        # Full-sample fit as a semopy-like inspect() table (regression rows only)
+        estimates, std_errs, pvals = (v[0] for v in self.fit(values, np.ones((1, len(values)))))
+        variables = [self.X] + self.mediators + [self.Y]
+        rows = [(variables[outcome], '~', variables[predictor]) for predictor, outcome in self.path_ends.values()]
+        table = pd.DataFrame(rows, columns=['lval', 'op', 'rval'], index=self.paths)
+        table['Estimate'], table['Std. Err'] = estimates, std_errs
+        table['z-value'], table['p-value'] = estimates / std_errs, pvals
+        return table
+
+
+def joint_block(model, values, seed, size):
+    # One block of joint-model replicates: paths and effects, with p-values for the paths (NaN for the effects)
+    weights = resample_counts(len(values), size, np.random.default_rng(seed))
+    estimates, _, pvals = model.fit(values, weights)
+    effects = model.effect_values(estimates)
+    return np.hstack([estimates, effects]), np.hstack([pvals, np.full(effects.shape, np.nan)])
+
+
+class JointResult:
+    """
+    Bootstrap replicates of a JointModel: (n_rep x n_columns) estimates and p-values in model.columns order (paths,
+    then effects), all from the same resamples, plus the full-sample point estimates.
+    """
+
+    def __init__(self, model, point, estimates, pvals):
+        self.model = model
+        self.point = point
+        self.estimates = estimates
+        self.pvals = pvals
+
+    def __repr__(self):
+        return f"JointResult(n_rep={len(self)}, {self.model!r})"
+
+    def __len__(self):
+        return self.estimates.shape[0]
+
+    def ci(self, level=0.95, names=None):
+        # Full-sample estimate and percentile interval for each column (all by default)
+        names = self.model.columns if names is None else names
+        cols = [self.model.columns.index(name) for name in names]
+        tail = (1 - level) / 2 * 100
+        bounds = np.percentile(self.estimates[:, cols], [tail, 100 - tail], axis=0)
+        return pd.DataFrame({'Estimate': self.point[cols], 'Lower Bound': bounds[0], 'Upper Bound': bounds[1]},
+                            index=names)
+
+    def paths(self, level=0.95):
+        table = self.ci(level, self.model.paths)
+        table.insert(0, 'path', [self.model.describe(name) for name in table.index])
+        return table
+
+    def effects(self, level=0.95):
+        table = self.ci(level, self.model.effects)
+        table.insert(0, 'path', [self.model.describe(name) for name in table.index])
+        # An effect is significant when its interval excludes zero
+        table['sig'] = np.where((table['Lower Bound'] > 0) | (table['Upper Bound'] < 0), '*', '')
+        return table
+
+    def significance(self, alpha=0.05, scale=1):
+        # Proportion of replicates with (scale * p-value) < alpha for each path
+        n_paths = len(self.model.paths)
+        return pd.Series((self.pvals[:, :n_paths] * scale < alpha).mean(axis=0), index=self.model.paths)
+
+
+def joint_bootstrap(model, data, n_rep=2000, n_jobs=1, seed=None, progress=True):
+    """
+    One bootstrap over the joint design: every replicate refits all equations on the same resample, so the specific
+    indirect effects, their contrasts and the total effect share replicates. Seeded in BLOCK_SIZE blocks like
+    run_bootstrap, so results are reproducible for any n_jobs.
+    """
+    values = model.values(data)
+    point_paths = model.fit(values, np.ones((1, len(values))))[0]
+    point = np.hstack([point_paths, model.effect_values(point_paths)])[0]
+
+    n_cols = len(model.columns)
+    out = (np.empty((n_rep, n_cols)), np.empty((n_rep, n_cols)))
+    run_bootstrap(joint_block, (model, values), n_rep=n_rep, n_jobs=n_jobs, seed=seed, progress=progress, out=out)
+    return JointResult(model, point, *out)
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from BootstrapEngine import batched_ols, resample_counts
+
+# Same rows and columns as statsmodels' MediationResults.summary()
+SUMMARY_INDEX = ['ACME (control)', 'ACME (treated)', 'ADE (control)', 'ADE (treated)', 'Total effect',
+                 'Prop. mediated (control)', 'Prop. mediated (treated)', 'ACME (average)', 'ADE (average)',
+                 'Prop. mediated (average)']
+SUMMARY_COLUMNS = ['Estimate', 'Lower CI bound', 'Upper CI bound', 'P-value']
+
+
+def _pvalue(vec):
+    # statsmodels' two-sided bootstrap p-value: twice the share of replicates on the minority side of zero
+    return 2 * np.minimum((vec > 0).sum(), (vec < 0).sum()) / len(vec)
+
+
+def summary_table(acme_ctrl, acme_tx, ade_ctrl, ade_tx, alpha=0.05):
+    # Summary of per-replicate effects, computed exactly as MediationResults.summary()
+    total = (acme_ctrl + acme_tx + ade_ctrl + ade_tx) / 2
+    prop_ctrl, prop_tx = acme_ctrl / total, acme_tx / total
+    vecs = [acme_ctrl, acme_tx, ade_ctrl, ade_tx, total, prop_ctrl, prop_tx,
+            (acme_ctrl + acme_tx) / 2, (ade_ctrl + ade_tx) / 2, (prop_ctrl + prop_tx) / 2]
+
+    rows = []
+    for name, vec in zip(SUMMARY_INDEX, vecs):
+        # Proportions are summarised by their median, everything else by the mean
+        estimate = np.median(vec) if name.startswith('Prop.') else vec.mean()
+        lower, upper = np.percentile(vec, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+        rows.append([estimate, lower, upper, _pvalue(vec)])
+    return pd.DataFrame(rows, index=SUMMARY_INDEX, columns=SUMMARY_COLUMNS)
+
+
+def bootstrap_mediation(outcome_design, mediator_design, y, m, exp_outcome, med_outcome, exp_mediator,
+                        n_rep=2000, seed=None, alpha=0.05, batch_size=None):
+    """
+    Native counterpart of statsmodels' Mediation(OLS outcome, OLS mediator).fit(method='bootstrap') for linear
+    models without exposure interactions. outcome_design and mediator_design are the pre-built exog matrices
+    (with intercept); exp_outcome, med_outcome and exp_mediator are the column positions of the exposure and
+    mediator in them.
+
+    As in statsmodels, each replicate refits the two models on independent resamples and simulates the potential
+    mediators under exposure 0 and 1 from the fitted mediator distribution (scale = SSR / df_resid). With a linear
+    outcome model the indirect effect is then b * (a + mean(e1 - e0)) and the direct effect is c, so the n simulated
+    errors enter only through their mean difference, drawn here as one N(0, 2 * scale / n) value per replicate.
+    """
+    outcome_design, mediator_design, y, m = (np.asarray(v, dtype=np.float64)
+                                             for v in (outcome_design, mediator_design, y, m))
+    n = len(y)
+    rng = np.random.default_rng(seed)
+    if batch_size is None:
+        batch_size = max(1, 2_000_000 // max(n, 1))
+
+    a, b, c, scale = (np.empty(n_rep) for _ in range(4))
+    for start in range(0, n_rep, batch_size):
+        size = min(batch_size, n_rep - start)
+        rows = slice(start, start + size)
+
+        # Outcome and mediator models are refit on independent resamples, one batched solve each
+        outcome_params, _ = batched_ols(outcome_design, y, resample_counts(n, size, rng))
+        mediator_params, ssr = batched_ols(mediator_design, m, resample_counts(n, size, rng))
+
+        b[rows], c[rows] = outcome_params[:, med_outcome], outcome_params[:, exp_outcome]
+        a[rows], scale[rows] = mediator_params[:, exp_mediator], ssr / (n - mediator_design.shape[1])
+
+    acme = b * (a + rng.normal(0, np.sqrt(2 * scale / n)))
+    return summary_table(acme, acme, c, c, alpha=alpha)
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'results')
+
+# Any change to these files invalidates every cached result
+CODE_FILES = ['BootstrapEngine.py', 'BootstrapResult.py', 'MediationAnalyzer.py', 'SemFitter.py']
+
+_code_version = None
+
+
+def code_version():
+    global _code_version
+    if _code_version is None:
+        sha = hashlib.sha256()
+        for name in CODE_FILES:
+            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), 'rb') as f:
+                sha.update(f.read())
+        _code_version = sha.hexdigest()
+    return _code_version
+
+
+def data_fingerprint(df):
+    # Content hash of exactly the rows/columns an analysis runs on
+    sha = hashlib.sha256(json.dumps(list(map(str, df.columns))).encode())
+    sha.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return sha.hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed on-disk store for fitted results. Entries are .npz files named by the sha256 of their key
+    fields plus the code version; the least recently used entries are evicted once the directory grows past
+    max_bytes.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_DIR, max_bytes=512 * 2 ** 20):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def __repr__(self):
+        return f"ResultCache({self.cache_dir}, hits={self.hits}, misses={self.misses})"
+
+    def key(self, **fields):
+        fields['code_version'] = code_version()
+        return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.npz')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as entry:
+                arrays = {name: entry[name] for name in entry.files}
+            # Mark as recently used for LRU eviction
+            os.utime(path)
+        except (OSError, ValueError, EOFError, zipfile.BadZipFile):
+            # Missing, evicted meanwhile or unreadable entries are misses
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return arrays
+
+    def put(self, key, **arrays):
+        # Written to a temporary file of its own, then renamed into place, so concurrent writers of the same key
+        # (processes or server workers) never share a partial file and readers only see complete entries
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, prefix=f'{key}.', suffix='.tmp.npz', delete=False) as f:
+            tmp = f.name
+            try:
+                np.savez(f, **arrays)
+            except BaseException:
+                f.close()
+                os.remove(tmp)
+                raise
+        os.replace(tmp, self._path(key))
+        self._evict()
+
+    def get_table(self, key):
+        arrays = self.get(key)
+        if arrays is None:
+            return None
+        columns = list(arrays.pop('__columns__'))
+        return pd.DataFrame({col: arrays[col] for col in columns})
+
+    def put_table(self, key, df):
+        arrays = {col: df[col].to_numpy() if pd.api.types.is_numeric_dtype(df[col]) else df[col].to_numpy(dtype=str)
+                  for col in df.columns}
+        self.put(key, __columns__=np.array(df.columns, dtype=str), **arrays)
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npz') and not name.endswith('.tmp.npz'):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    # Evicted by another process meanwhile
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def stats(self):
+        entries = self._entries()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(entries),
+                'bytes': sum(size for _, size, _ in entries)}
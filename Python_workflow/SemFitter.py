@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from BootstrapEngine import resample_indices
+
+# Single mediator model over generic variable names; SemFitter maps them to the analysed columns
+MEDIATION_SPEC = """
+# Direct effects
+Y ~ c*X
+M ~ a*X
+
+# Indirect effects
+Y ~ b*M
+"""
+
+# SLSQP options for every fit. scipy's default ftol (1e-6) stops warm-started fits close to their starting values
+# (up to a few percent off on a); at 1e-12 they agree with the closed-form solution to ~1e-6, so the closed-form
+# full-sample fit and jackknife used for BCa are consistent with the replicates.
+SOLVER_OPTIONS = {'ftol': 1e-12, 'maxiter': 10000}
+
+# Compiled semopy models of this process, one per model structure (spec)
+_models = {}
+
+
+def compile_model(spec):
+    # The semopy Model of a structure, parsed and laid out once per process and refitted in place afterwards
+    if spec not in _models:
+        from semopy import Model
+        _models[spec] = Model(spec)
+    return _models[spec]
+
+
+def covariances(values, idx):
+    # ML (divisor n) covariance matrices of the resampled rows of values (n x k), one per row of idx (n_rep x n)
+    rows = values[idx]
+    rows = rows - rows.mean(axis=1, keepdims=True)
+    return np.einsum('rni,rnj->rij', rows, rows) / idx.shape[1]
+
+
+class SemFitter:
+    """
+    Reusable semopy fits of one model structure. The spec is written over generic variable names and compiled once
+    per process (compile_model); names maps them to data columns, e.g. {'X': 'PrimaryDx_ASD', 'M': 'WISC_FSIQ',
+    'Y': 'PercentAccuracy_GTI'}. fit_data() is the full-sample fit (semopy's data-based starting values);
+    fit_cov() refits from a covariance matrix alone, starting from given parameter values (warm start) and retrying
+    from the default starting values when that does not converge.
+    """
+
+    def __init__(self, names, spec=MEDIATION_SPEC, labels=('a', 'c', 'b')):
+        self.names, self.spec, self.labels = dict(names), spec, list(labels)
+        self.model = compile_model(spec)
+        self.observed = self.model.vars['observed']
+        active = [name for name, param in self.model.parameters.items() if param.active]
+        self.positions = [active.index(label) for label in self.labels]
+
+    def __repr__(self):
+        return f"SemFitter({self.names})"
+
+    def values(self, data):
+        # (n x k) float64 array of the data columns in the model's observed-variable order
+        return data[[self.names[var] for var in self.observed]].to_numpy(dtype=np.float64)
+
+    def fit_data(self, data):
+        # Full-sample fit from a clean slate; returns semopy's SolverResult
+        frame = data[[self.names[var] for var in self.observed]]
+        return self.model.fit(frame.set_axis(self.observed, axis=1), clean_slate=True, options=dict(SOLVER_OPTIONS))
+
+    def start(self):
+        # Current parameter values, e.g. the full-sample solution to warm-start replicate fits from
+        return self.model.param_vals.copy()
+
+    def fit_cov(self, cov, n, start):
+        """
+        Fit to a (k x k) covariance matrix of n rows, in observed order, warm-started from start. Returns (estimates,
+        standard errors, iterations, converged) with the labelled parameters in labels order.
+        """
+        from semopy.stats import calc_se
+
+        self.model.load_cov(cov)
+        self.model.n_samples = n
+        self.model.param_vals = start.copy()
+        result = self.model.fit(options=dict(SOLVER_OPTIONS))
+        iterations = result.n_it
+        if not result.success:
+            # Cold retry from semopy's default starting values for this covariance matrix
+            self.model.load(cov=pd.DataFrame(cov, index=self.observed, columns=self.observed), n_samples=n,
+                            clean_slate=True)
+            result = self.model.fit(options=dict(SOLVER_OPTIONS))
+            iterations += result.n_it
+
+        estimates = self.model.param_vals[self.positions]
+        std_errs = np.asarray(calc_se(self.model))[self.positions]
+        return estimates, std_errs, iterations, bool(result.success)
+
+    def inspect(self):
+        # semopy inspect() table of the last fit, with the generic names replaced by the data columns
+        table = self.model.inspect()
+        table[['lval', 'rval']] = table[['lval', 'rval']].replace(self.names)
+        return table
+
+
+def semopy_block(names, spec, values, start, seed, size):
+    """
+    One block of semopy replicates (same index draws as BootstrapEngine.numpy_block): the block's covariance
+    matrices are computed in one vectorized pass and every fit is warm-started from start (the full-sample
+    solution). Replicates that do not converge even from the default starting values are NaN rows, listed under
+    'failed' (block-relative) in the block details.
+    """
+    fitter = SemFitter(names, spec)
+    idx = resample_indices(len(values), size, np.random.default_rng(seed))
+    estimates = np.empty((size, len(fitter.labels)))
+    pvals = np.empty((size, len(fitter.labels)))
+    std_errs = np.empty((size, len(fitter.labels)))
+    iterations, failed = 0, []
+
+    for r, cov in enumerate(covariances(values, idx)):
+        est, se, n_it, converged = fitter.fit_cov(cov, len(values), start)
+        iterations += n_it
+        if not converged:
+            failed.append(r)
+            est = se = np.full(len(fitter.labels), np.nan)
+        estimates[r], std_errs[r] = est, se
+        pvals[r] = 2 * norm.sf(np.abs(est / se))
+
+    return estimates, pvals, std_errs, {'iterations': iterations, 'not_converged': len(failed), 'failed': failed}
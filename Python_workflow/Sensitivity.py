@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from BootstrapEngine import PATHS, fit_paths
+from MediationSweep import sweep
+
+# Correlations between the mediator and outcome model errors (rho) at which the indirect effect is evaluated
+RHO_GRID = np.round(np.linspace(-0.99, 0.99, 199), 2)
+
+
+def acme_curve(a, b, resid_ratio, rho=RHO_GRID):
+    """
+    Indirect effect (ACME) of the linear X -> M -> Y model when the mediator and outcome errors correlate at rho
+    (Imai, Keele & Yamamoto, 2010): a * (b - rho * sqrt(resid_ratio / (1 - rho^2))), where resid_ratio is the
+    outcome / mediator residual variance ratio of the fit (n * se_b^2). rho = 0 gives ab. a, b and resid_ratio may be
+    arrays (e.g. one entry per replicate); the result has one row per entry and one column per rho.
+    """
+    a, b, resid_ratio = (np.asarray(v, dtype=np.float64)[..., None] for v in (a, b, resid_ratio))
+    rho = np.asarray(rho, dtype=np.float64)
+    return a * (b - rho * np.sqrt(resid_ratio / (1 - rho ** 2)))
+
+
+def rho_at_zero(b, resid_ratio):
+    # The rho at which the ACME is 0: the correlation of the mediator and outcome errors that explains ab away
+    return b / np.sqrt(b ** 2 + resid_ratio)
+
+
+def sensitivity(x, m, y, rho=RHO_GRID, bootstrap=None, level=0.95):
+    """
+    ACME, its interval and percent mediated at every rho of the grid, for the single mediator model of x, m, y.
+    Intervals are the percentiles of the ACME curves of the bootstrap replicates (a BootstrapResult; its a, b and
+    standard errors give each replicate's curve, all evaluated in one broadcast) or, without replicates, delta-method
+    intervals (Sobel at rho = 0). Returns (table, rho at which the ACME is 0).
+    """
+    estimates, std_errs, _, resid = fit_paths(x, m, y)
+    a, c, b = (estimates[PATHS.index(name)] for name in ['a', 'c', 'b'])
+    rho = np.asarray(rho, dtype=np.float64)
+    resid_ratio = resid[1] / resid[0]
+    acme = acme_curve(a, b, resid_ratio, rho)
+
+    tail = (1 - level) / 2
+    if bootstrap is None:
+        # rho term held at its full-sample value: var(a * k) ~ k^2 se_a^2 + a^2 se_b^2, with k = acme / a
+        se = np.sqrt((acme / a * std_errs[PATHS.index('a')]) ** 2 + (a * std_errs[PATHS.index('b')]) ** 2)
+        lower, upper = acme - norm.isf(tail) * se, acme + norm.isf(tail) * se
+    else:
+        se_b = bootstrap.std_errs[:, PATHS.index('b')]
+        curves = acme_curve(bootstrap.a, bootstrap.b, len(x) * se_b ** 2, rho)
+        lower, upper = np.nanpercentile(curves, [tail * 100, 100 - tail * 100], axis=0)
+
+    table = pd.DataFrame({'rho': rho, 'acme': acme, 'lower': lower, 'upper': upper,
+                          'percent_mediated': np.abs(acme / (c + a * b)) * 100})
+    return table, float(rho_at_zero(b, resid_ratio))
+
+
+def sensitivity_sweep(sample, mediators, X='PrimaryDx_ASD', Y='PercentAccuracy_GTI', rho=RHO_GRID, level=0.95):
+    """
+    Sensitivity of every mediator (see MediationSweep.sweep) in one pass: one row per mediator with the indirect
+    effect, percent mediated, the rho at which the ACME is 0 and the range of grid rho over which its delta-method
+    interval covers 0 (around rho_zero; NaN when the grid has no such rho).
+    """
+    fits = sweep(sample, mediators, X, Y, std_errs=True)
+    a, b, se_a, se_b = (fits[col].to_numpy() for col in ['a', 'b', 'se_a', 'se_b'])
+    resid_ratio = fits['n'].to_numpy() * se_b ** 2
+    rho = np.asarray(rho, dtype=np.float64)
+
+    # mediators x rho grid
+    acme = acme_curve(a, b, resid_ratio, rho)
+    se = np.sqrt((acme * (se_a / a)[:, None]) ** 2 + (a * se_b)[:, None] ** 2)
+    covers = np.abs(acme) <= norm.isf((1 - level) / 2) * se
+    null = covers.any(axis=1)
+
+    table = fits[['mediator', 'n', 'indirect', 'percent_mediated']].copy()
+    table['rho_zero'] = rho_at_zero(b, resid_ratio)
+    table['rho_null_min'] = np.where(null, np.where(covers, rho, np.inf).min(axis=1), np.nan)
+    table['rho_null_max'] = np.where(null, np.where(covers, rho, -np.inf).max(axis=1), np.nan)
+    return table
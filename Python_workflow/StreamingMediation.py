@@ -0,0 +1,114 @@
+import os
+
+import numpy as np
+
+from BootstrapEngine import fit_table, paths_from_moments
+from BootstrapResult import BootstrapResult
+from Instrumentation import stage
+
+CHUNK_ROWS = 500_000
+
+# Weighted sums accumulated per replicate, over the shifted x, m, y of the complete rows
+MOMENTS = ['w', 'x', 'm', 'y', 'xx', 'xm', 'xy', 'mm', 'my', 'yy']
+
+
+def iter_chunks(path, columns, chunksize=CHUNK_ROWS):
+    # (n x 3) float64 arrays of the complete rows of columns, read chunk by chunk from a CSV or Parquet file
+    if os.path.splitext(path)[1].lower() in ['.parquet', '.pq']:
+        import pyarrow.parquet as pq
+        batches = (batch.to_pandas() for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize,
+                                                                                     columns=columns))
+    else:
+        import pandas as pd
+        batches = pd.read_csv(path, usecols=columns, chunksize=chunksize)
+
+    for frame in batches:
+        values = frame[columns].to_numpy(dtype=np.float64)
+        yield values[~np.isnan(values).any(axis=1)]
+
+
+def count_rows(path, columns, chunksize=CHUNK_ROWS):
+    # Complete rows of columns (one scan; needed up front by the multinomial bootstrap)
+    return sum(len(values) for values in iter_chunks(path, columns, chunksize))
+
+
+def _features(values, shift):
+    # Per-row terms of MOMENTS; shifting by a reference point keeps the raw sums well conditioned for large n
+    x, m, y = (values - shift).T
+    return np.column_stack([np.ones_like(x), x, m, y, x * x, x * m, x * y, m * m, m * y, y * y])
+
+
+def paths_from_sums(sums):
+    # a, c, b estimates, standard errors, p-values (PATHS order) from MOMENTS sums, one set per row of sums
+    w, x, m, y, xx, xm, xy, mm, my, yy = np.moveaxis(sums, -1, 0)
+    return paths_from_moments(xx - x * x / w, xm - x * m / w, xy - x * y / w,
+                              mm - m * m / w, my - m * y / w, yy - y * y / w, w)
+
+
+def stream_sums(path, X, M, Y, n_rep=0, weights='poisson', seed=None, chunksize=CHUNK_ROWS, n_rows=None):
+    """
+    One pass over the file: the full-sample MOMENTS sums and, for n_rep > 0, the same sums under bootstrap weights
+    for every replicate, accumulated chunk by chunk (memory does not grow with the number of rows).
+    weights='poisson' gives every row an independent Poisson(1) count per replicate. weights='multinomial' is the
+    ordinary n-out-of-n bootstrap: each chunk's share of the n draws is binomial given the draws left, then split
+    multinomially over its rows. It needs n_rows (complete rows), which count_rows finds in a first pass.
+    Weights come from one SeedSequence child per chunk, so results depend on seed and chunksize only.
+    """
+    columns = [X, M, Y]
+    if weights == 'multinomial' and n_rows is None:
+        n_rows = count_rows(path, columns, chunksize)
+    elif weights not in ['poisson', 'multinomial']:
+        raise ValueError(f"Unknown weights: {weights} (expected 'poisson' or 'multinomial')")
+
+    # Replicates x rows of weights held at once
+    block_rows = max(1, 4_000_000 // max(n_rep, 1))
+    root = np.random.SeedSequence(seed)
+    full, reps = np.zeros(len(MOMENTS)), np.zeros((n_rep, len(MOMENTS)))
+    draws_left, rows_left = np.full(n_rep, n_rows or 0), n_rows
+    shift = None
+
+    for values in iter_chunks(path, columns, chunksize):
+        rng = np.random.default_rng(root.spawn(1)[0])
+        if not len(values):
+            continue
+        if shift is None:
+            shift = values.mean(axis=0)
+
+        with stage('stream chunk', rows=len(values), n_rep=n_rep):
+            features = _features(values, shift)
+            full += features.sum(axis=0)
+            if not n_rep:
+                continue
+
+            if weights == 'multinomial':
+                chunk_draws = rng.binomial(draws_left, len(values) / rows_left)
+                draws_left, rows_left = draws_left - chunk_draws, rows_left - len(values)
+
+            for start in range(0, len(values), block_rows):
+                block = features[start:start + block_rows]
+                if weights == 'poisson':
+                    w = rng.poisson(1.0, size=(n_rep, len(block)))
+                else:
+                    # This block's share of the chunk's draws, then spread uniformly over its rows
+                    rows_after = len(values) - start
+                    block_draws = rng.binomial(chunk_draws, len(block) / rows_after)
+                    chunk_draws = chunk_draws - block_draws
+                    w = rng.multinomial(block_draws, np.full(len(block), 1 / len(block)))
+                reps += w @ block
+
+    return full, reps
+
+
+def streaming_bootstrap(path, X, M, Y, n_rep=2000, weights='poisson', seed=None, chunksize=CHUNK_ROWS):
+    """
+    Out-of-core fit of M ~ a*X, Y ~ c*X + b*M: the full-sample estimates (as a semopy-like inspect() table, with n
+    complete rows) and n_rep bootstrap replicates (BootstrapResult), from one scan of a CSV/Parquet file (two with
+    multinomial weights). Parquet input needs pyarrow.
+    """
+    full, reps = stream_sums(path, X, M, Y, n_rep=n_rep, weights=weights, seed=seed, chunksize=chunksize)
+    if full[0] == 0:
+        raise ValueError(f"No complete rows of {[X, M, Y]} in {path}")
+
+    n = int(full[0])
+    estimates, std_errs, pvals, _ = paths_from_sums(reps)
+    return fit_table(X, Y, M, *paths_from_sums(full), n), n, BootstrapResult(estimates, pvals, std_errs)
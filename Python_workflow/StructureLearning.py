@@ -0,0 +1,223 @@
+
+import numpy as np
+import pandas as pd
+
+from BootstrapEngine import process_pool
+from Instrumentation import stage
+
+
+def blacklist(columns, X, Y):
+    """
+    Banned arcs as a (k x k) boolean matrix, [from, to]: nothing into X and nothing out of Y (as generate_blacklist
+    in R_workflow/CausalDiscovery.R), and no self-loops.
+    """
+    columns = list(columns)
+    banned = np.eye(len(columns), dtype=bool)
+    banned[:, columns.index(X)] = True
+    banned[columns.index(Y), :] = True
+    return banned
+
+
+class FamilyScore:
+    """
+    Gaussian BIC of one node given its parents (its family), from the ML covariance matrix of the data:
+    -n/2 * (log(2 pi s2) + 1) - (|parents| + 2)/2 * log(n), with s2 the residual variance of the node's regression on
+    its parents. The network score is the sum over families, so a move only changes the scores of the families it
+    touches. Scores are cached by (node, parent set); calls and computed count lookups and cache misses.
+    """
+
+    def __init__(self, cov, n):
+        self.cov, self.n = np.asarray(cov, dtype=np.float64), n
+        self.cache = {}
+        self.calls = self.computed = 0
+
+    def __call__(self, node, parents):
+        self.calls += 1
+        key = (node, frozenset(parents))
+        if key not in self.cache:
+            self.computed += 1
+            parents = sorted(parents)
+            var = self.cov[node, node]
+            if parents:
+                cross = self.cov[parents, node]
+                var -= cross @ np.linalg.solve(self.cov[np.ix_(parents, parents)], cross)
+            self.cache[key] = -self.n / 2 * (np.log(2 * np.pi * var) + 1) - (len(parents) + 2) / 2 * np.log(self.n)
+        return self.cache[key]
+
+
+def _reaches(parents, start, target, skip=None):
+    # Whether a directed path start -> ... -> target exists, ignoring the arc skip=(u, v)
+    children = [[v for v in range(len(parents)) if u in parents[v] and (u, v) != skip] for u in range(len(parents))]
+    seen, stack = {start}, [start]
+    while stack:
+        for child in children[stack.pop()]:
+            if child == target:
+                return True
+            if child not in seen:
+                seen.add(child)
+                stack.append(child)
+    return False
+
+
+def hill_climb(score, banned, parents=None, max_parents=None, max_iter=10_000, tol=1e-8):
+    """
+    Greedy hill-climbing over DAGs from parents (one set per node; empty graph by default): each step applies the
+    legal arc addition, deletion or reversal that raises the score most, until none does. The score change of every
+    move is held in matrices and, after a move, only the entries of the one or two families it changed are
+    re-scored. Acyclicity is checked only for the moves tried. Returns (parents, network score, steps).
+    """
+    k = len(banned)
+    parents = [set() for _ in range(k)] if parents is None else [set(p) for p in parents]
+    max_parents = k if max_parents is None else max_parents
+    local = np.array([score(v, parents[v]) for v in range(k)])
+    toggle = np.full((k, k), -np.inf)  # [u, v]: add u -> v when absent, delete it when present
+    reverse = np.full((k, k), -np.inf)  # [u, v]: turn an existing u -> v into v -> u
+
+    def rescore_toggle(v):
+        for u in range(k):
+            if u in parents[v]:
+                toggle[u, v] = score(v, parents[v] - {u}) - local[v]
+            elif not banned[u, v] and len(parents[v]) < max_parents:
+                toggle[u, v] = score(v, parents[v] | {u}) - local[v]
+            else:
+                toggle[u, v] = -np.inf
+
+    def rescore_reverse(v):
+        # Reversals of the arcs into and out of v, which depend on v's family and the other end's
+        for u in range(k):
+            for a, b in [(u, v), (v, u)]:
+                if a in parents[b] and not banned[b, a] and len(parents[a]) < max_parents:
+                    reverse[a, b] = toggle[a, b] + score(a, parents[a] | {b}) - local[a]
+                else:
+                    reverse[a, b] = -np.inf
+
+    for v in range(k):
+        rescore_toggle(v)
+    for v in range(k):
+        rescore_reverse(v)
+
+    steps = 0
+    while steps < max_iter:
+        # Best legal move: candidates in decreasing order of gain, skipping those that would close a cycle
+        gains = np.concatenate([toggle.ravel(), reverse.ravel()])
+        move = None
+        for i in np.argsort(-gains, kind='stable'):
+            if gains[i] <= tol:
+                break
+            kind, (u, v) = ('toggle', 'reverse')[i // (k * k)], divmod(i % (k * k), k)
+            if kind == 'toggle' and u in parents[v]:
+                move = (kind, u, v)
+            elif kind == 'toggle' and not _reaches(parents, v, u):
+                move = (kind, u, v)
+            elif kind == 'reverse' and not _reaches(parents, u, v, skip=(u, v)):
+                move = (kind, u, v)
+            if move is not None:
+                break
+        if move is None:
+            break
+
+        kind, u, v = move
+        changed = [v]
+        if kind == 'toggle':
+            parents[v] ^= {u}
+        else:
+            parents[v].discard(u)
+            parents[u].add(v)
+            changed.append(u)
+        for node in changed:
+            local[node] = score(node, parents[node])
+        for node in changed:
+            rescore_toggle(node)
+        for node in changed:
+            rescore_reverse(node)
+        steps += 1
+
+    return parents, float(local.sum()), steps
+
+
+def perturb(parents, banned, n_moves, rng, max_parents=None):
+    # n_moves random legal arc additions, deletions or reversals (bnlearn's restart perturbation)
+    k = len(banned)
+    parents = [set(p) for p in parents]
+    max_parents = k if max_parents is None else max_parents
+    done = 0
+    for _ in range(100 * n_moves):
+        if done == n_moves:
+            break
+        u, v = rng.choice(k, size=2, replace=False)
+        if u in parents[v]:
+            if rng.random() < 0.5:
+                parents[v].discard(u)
+            elif not banned[v, u] and len(parents[u]) < max_parents and not _reaches(parents, u, v, skip=(u, v)):
+                parents[v].discard(u)
+                parents[u].add(v)
+            else:
+                continue
+        elif not banned[u, v] and len(parents[v]) < max_parents and not _reaches(parents, v, u):
+            parents[v].add(u)
+        else:
+            continue
+        done += 1
+    return parents
+
+
+def _restart(cov, n, banned, start, n_moves, max_parents, seed):
+    # One restart (run in a worker process): perturb the first solution, then climb again; own score cache
+    score = FamilyScore(cov, n)
+    parents = perturb(start, banned, n_moves, np.random.default_rng(seed), max_parents)
+    parents, total, steps = hill_climb(score, banned, parents, max_parents)
+    return parents, total, {'steps': steps, 'calls': score.calls, 'computed': score.computed}
+
+
+def path_mediators(parents, columns, X, Y):
+    # Nodes on a directed X -> ... -> Y path (descendants of X that are ancestors of Y), in column order
+    columns = list(columns)
+    x, y = columns.index(X), columns.index(Y)
+    return [col for i, col in enumerate(columns)
+            if i not in (x, y) and _reaches(parents, x, i) and _reaches(parents, i, y)]
+
+
+def learn_structure(data, X='PrimaryDx_ASD', Y='PercentAccuracy_GTI', restarts=10, n_moves=3, max_parents=None,
+                    n_jobs=1, seed=None):
+    """
+    Gaussian-BIC hill-climbing over the columns of data (complete cases; X is scored as a numeric 0/1 column), with
+    nothing into X and nothing out of Y. The first climb starts from the empty graph; each restart perturbs its
+    result by n_moves random moves and climbs again, in a process pool when n_jobs != 1 (-1 uses every core), with
+    one SeedSequence child per restart, so results depend on seed only. Family scores come from one covariance
+    matrix computed up front.
+    Returns (arcs, score, mediators): the best network's arcs as a from/to DataFrame, its BIC, and the candidate
+    mediators on X -> ... -> Y paths, e.g. for MediationSweep.sweep(sample, mediators).
+    """
+    columns = list(data.columns)
+    values = data.dropna().to_numpy(dtype=np.float64)
+    n = len(values)
+    cov = np.cov(values, rowvar=False, bias=True)
+    constant = [col for col, var in zip(columns, np.diag(cov)) if not var > 0]
+    if constant:
+        raise ValueError(f"No variation in {constant} over the {n} complete rows; they cannot be scored.")
+    banned = blacklist(columns, X, Y)
+
+    with stage('structure search', nodes=len(columns), rows=n, restarts=restarts) as details:
+        score = FamilyScore(cov, n)
+        best, best_score, steps = hill_climb(score, banned, max_parents=max_parents)
+        details.update(steps=steps, calls=score.calls, computed=score.computed)
+
+        seeds = np.random.SeedSequence(seed).spawn(restarts)
+        jobs = [(cov, n, banned, best, n_moves, max_parents, s) for s in seeds]
+        pool = process_pool(n_jobs, restarts)
+        if pool is None:
+            results = [_restart(*job) for job in jobs]
+        else:
+            with pool:
+                results = list(pool.map(_restart, *zip(*jobs)))
+
+        # Ties keep the earlier network, so the result does not depend on n_jobs
+        for parents, total, info in results:
+            details.update({key: details[key] + info[key] for key in ['steps', 'calls', 'computed']})
+            if total > best_score + 1e-8:
+                best, best_score = parents, total
+        details['score'] = best_score
+
+    arcs = pd.DataFrame([(columns[u], columns[v]) for v in range(len(columns)) for u in sorted(best[v])],
+                        columns=['from', 'to'])
+    return arcs, best_score, path_mediators(best, columns, X, Y)
@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+X, Y = 'PrimaryDx_ASD', 'PercentAccuracy_GTI'
+
+# Mediators of UPDATED_DATA.csv: (non-ASD mean, ASD - non-ASD difference, within-group SD), rounded from the real
+# data. The difference is the default true a path.
+MEDIATORS = {'Brf_P_Init_T': (49.2, 14.6, 12.9),
+             'Brf_P_PlnOrg_T': (49.3, 16.2, 14.5),
+             'ADHD_Inattention_Composite_Score': (50.3, 14.3, 16.8),
+             'WISC_PSI_Processing_Speed_Index': (100.0, -9.4, 14.7),
+             'WMem_Composite_Score': (40.7, -15.1, 15.2),
+             'WISC4_PRI_Perceptual_Reasoning_Index': (110.4, -2.3, 12.9),
+             'WISC_FSIQ': (111.8, -9.1, 14.0),
+             'PKT_Total_Correct': (29.0, -2.4, 3.4),
+             'Social_Motivation_Composite_Score': (69.1, 29.5, 18.8),
+             'SRS_P_2_Restricted_Interest_and_Repetitive_Behavior_T_Score': (46.5, 28.0, 15.9),
+             'Motor_Composite_Score': (5.0, 12.4, 10.9)}
+
+
+def _per_mediator(value, default):
+    # Scalar (same for every mediator), dict (per mediator, default for the rest) or None (default)
+    if value is None:
+        return dict(default)
+    if isinstance(value, dict):
+        return {**default, **value}
+    return {name: value for name in MEDIATORS}
+
+
+def generate(n, missing=0.0, a=None, b=-0.001, c=-0.1, p_asd=0.32, noise=0.15, seed=None):
+    """
+    Synthetic data with the UPDATED_DATA.csv columns used by the workflow (X, Y and the 11 mediators).
+    Every mediator is M = mean + a * X + e with its real within-group SD, and
+    Y = 0.74 + c * X + sum(b * (M - mean)) + e with SD noise. a, b and missing (the MCAR rate of each mediator cell;
+    X and Y stay complete) are scalars or per-mediator dicts; a defaults to the real ASD group differences.
+    """
+    rng = np.random.default_rng(seed)
+    a = _per_mediator(a, {name: diff for name, (_, diff, _) in MEDIATORS.items()})
+    b = _per_mediator(b, {name: 0.0 for name in MEDIATORS})
+    missing = _per_mediator(missing, {name: 0.0 for name in MEDIATORS})
+
+    x = (rng.random(n) < p_asd).astype(np.float64)
+    y = 0.74 + c * x + rng.normal(0, noise, n)
+    columns = {X: x}
+    for name, (mean, _, sd) in MEDIATORS.items():
+        m = mean + a[name] * x + rng.normal(0, sd, n)
+        y += b[name] * (m - mean)
+        m[rng.random(n) < missing[name]] = np.nan
+        columns[name] = m
+    columns[Y] = y
+
+    return pd.DataFrame(columns)[[X, Y] + list(MEDIATORS)]
+
+
+def write_csv(path, n, overwrite=False, **params):
+    # Generates and writes a synthetic CSV (kept if it already exists unless overwrite); returns the path
+    if overwrite or not os.path.exists(path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        generate(n, **params).to_csv(path, index=False)
+    return path
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+import SyntheticData
+
+# Single mediator test data: the synthetic X, Y and one mediator, with a non-zero b path
+NAMES = {'X': SyntheticData.X, 'M': 'WISC_FSIQ', 'Y': SyntheticData.Y}
+
+
+@pytest.fixture(scope='session')
+def names():
+    return dict(NAMES)
+
+
+@pytest.fixture(scope='session')
+def sample():
+    return SyntheticData.generate(300, b=-0.002, seed=0)[list(NAMES.values())]
+
+
+@pytest.fixture(scope='session')
+def xmy(sample):
+    # (x, m, y) float64 arrays of sample
+    return tuple(sample[NAMES[var]].to_numpy(dtype=np.float64) for var in ['X', 'M', 'Y'])
@@ -1,14 +1,28 @@
 import argparse
-from math import floor, ceil
-from time import sleep
-from os import getcwd, system, makedirs
+import sys
+from time import sleep as _sleep
+from os import getcwd, system
+from os.path import basename, splitext
 
-import numpy as np
 import pandas as pd
-from matplotlib import pyplot as plt
 from termcolor import colored
 
-from MediationAnalyzer import MediationAnalyzer
+import Instrumentation
+from BatchRunner import load_jobs, run_batch
+from HistogramRenderer import histogram_stats, render_all
+from IncrementalEstimator import IncrementalEstimator
+from MediationAnalyzer import Correlations, MediationAnalyzer
+from MediationSweep import sweep
+from ResultCache import ResultCache
+from Sensitivity import sensitivity_sweep
+from StreamingMediation import streaming_bootstrap
+from StructureLearning import learn_structure
+
+def sleep(seconds):
+    # Pauses show up as 'pause' stages in --profile/--trace output
+    with Instrumentation.stage('pause'):
+        _sleep(seconds)
+
 
 # Argument Parser
 parser = argparse.ArgumentParser(description="Run mediation analysis.")
@@ -18,17 +32,132 @@ parser.add_argument("--pc-all", action="store_true", help="Check percent mediate
 parser.add_argument("--pc", action="store", help="Check percent mediated by one variable.")
 parser.add_argument("--bs", action="store_true", help="Bootstrap sample general info")
 parser.add_argument("--bsplot", action="store_true", help="Plot a histogram based on bootstrap results and save .png")
+parser.add_argument("--plot-format", action="store", nargs='+', default=["png"], choices=["png", "svg", "pdf"],
+                    help="Image format(s) of the --bsplot histograms; each also gets a .json sidecar with its numbers. "
+                         "(DEFAULT: png)")
 parser.add_argument("-m", action="store", default="md", choices=["sm", "r", "md"],
                     help="Which model to use for running mediation analysis: sm (Stats Models), r (Semopy Inspect), "
                          "md (Semopy Markdown). (DEFAULT: Semopy Markdown)")
 parser.add_argument("-d", action="store", default="data", choices=["data", "ados"],
-                    help="Choose data source: data (full data), ados (ados data). (DEFAULT: full data)")
-
-parser.add_argument("--stats", action="store_true")
+                    help="Choose data source: data (full data), ados (ASD participants who met ADOS criteria, plus "
+                         "all non-ASD participants). (DEFAULT: full data)")
+parser.add_argument("-e", action="store", default=None, choices=["semopy", "numpy"],
+                    help="Estimation engine for the semopy (r) model and its bootstrap, and for the statsmodels (sm) "
+                         "mediation bootstrap: semopy (iterative SEM fit / statsmodels), numpy (closed-form, "
+                         "vectorized over all bootstrap replicates). (DEFAULT: semopy)")
+
+parser.add_argument("-n", action="store", type=int, default=None,
+                    help="Number of bootstrap replicates (the maximum when --tol is given) or Monte Carlo draws. "
+                         "(DEFAULT: 2000 replicates, 200000 draws)")
+parser.add_argument("--method", action="store", default="bootstrap", choices=["bootstrap", "monte_carlo"],
+                    help="Interval method for --bs/--bsplot: bootstrap (refit on resamples) or monte_carlo (draws of "
+                         "the a/b/c estimates from their joint normal, no refitting). (DEFAULT: bootstrap)")
+parser.add_argument("--interval", action="store", default="percentile",
+                    choices=["percentile", "bca", "studentized"],
+                    help="Bootstrap confidence interval for --bs/--bsplot: percentile, bca (bias-corrected and "
+                         "accelerated, with a closed-form jackknife) or studentized (bootstrap-t). "
+                         "(DEFAULT: percentile)")
+parser.add_argument("--joint", action="store", default=None, choices=["parallel", "serial"],
+                    help="With --bs: analyse the entered mediators (up to 3, in order) together in one parallel or "
+                         "serial (X -> M1 -> M2 -> Y) model, with one bootstrap for all specific indirect effects.")
+parser.add_argument("--stream", action="store", default=None,
+                    help="Out-of-core bootstrap straight from this CSV/Parquet file: one chunked scan accumulates the "
+                         "sufficient statistics of the full sample and of every replicate (memory independent of n).")
+parser.add_argument("--weights", action="store", default="poisson", choices=["poisson", "multinomial"],
+                    help="Bootstrap weights for --stream: poisson (one scan) or multinomial (exact n-out-of-n "
+                         "bootstrap, one extra scan to count rows). (DEFAULT: poisson)")
+parser.add_argument("--incremental", action="store_true",
+                    help="Refresh every mediator's fit from the rows added or changed since the last --incremental run "
+                         "(state in .cache/incremental); only mediators whose complete cases changed are bootstrapped "
+                         "again.")
+parser.add_argument("--key", action="store", default=None,
+                    help="Unique ID column that matches rows between --incremental runs. (DEFAULT: row position)")
+parser.add_argument("--sens", action="store", nargs="?", const="delta", default=None, choices=["delta", "bootstrap"],
+                    help="Sensitivity of the indirect effect to unmeasured mediator-outcome confounding: the ACME, its "
+                         "interval and percent mediated over a grid of error correlations rho, and the rho at which "
+                         "the ACME is 0. Intervals from the delta method or from a bootstrap (-n, -e, -j, --seed); "
+                         "'all' at the prompt summarises every mediator. (DEFAULT interval: delta)")
+parser.add_argument("--structure", action="store_true",
+                    help="Screen the mediators by structure learning: Gaussian-BIC hill-climbing over PrimaryDx_ASD, "
+                         "the outcome and every mediator (complete cases), with nothing into PrimaryDx_ASD and nothing "
+                         "out of the outcome; the mediators on PrimaryDx_ASD -> ... -> outcome paths are then swept.")
+parser.add_argument("--restarts", action="store", type=int, default=10,
+                    help="Random restarts of the --structure search, run on -j worker processes. (DEFAULT: 10)")
+parser.add_argument("--tol", action="store", type=float, default=None,
+                    help="Adaptive bootstrap: run replicates in batches and stop once the Monte Carlo error of every "
+                         "reported interval bound is below this fraction of its bootstrap SD (e.g. 0.05).")
+parser.add_argument("-j", action="store", type=int, default=1,
+                    help="Number of worker processes for the bootstrap (-1 uses every core). (DEFAULT: 1)")
+parser.add_argument("--seed", action="store", type=int, default=None,
+                    help="Random seed for the bootstrap; the same seed reproduces the same results for any -j.")
+
+parser.add_argument("--cache", action="store_true",
+                    help="Reuse fitted results and bootstrap replicates from the on-disk result cache "
+                         "(.cache/results).")
+
+parser.add_argument("--batch", action="store",
+                    help="Run the jobs in a JSON/YAML/CSV job spec headlessly (no pauses or prompts).")
+parser.add_argument("--out", action="store", default="-",
+                    help="Where --batch streams one result per job: a .jsonl or .csv file, or - for stdout (JSONL). "
+                         "(DEFAULT: stdout)")
+
+parser.add_argument("--stats", action="store_true",
+                    help="Correlations of the IV (PrimaryDx_ASD) with the outcome and every mediator variable.")
+parser.add_argument("--deletion", action="store", default="listwise", choices=["listwise", "pairwise"],
+                    help="Missing-data handling for --stats: listwise or pairwise-complete. (DEFAULT: listwise)")
+parser.add_argument("--correction", action="store", default=None, choices=["fdr", "bonferroni"],
+                    help="Multiple-comparison correction of the --stats p-values.")
+
+parser.add_argument("--profile", action="store", default=None,
+                    help="Write a JSON profile of the run (wall/CPU time, iterations and convergence per stage) to "
+                         "this file and print a per-stage summary.")
+parser.add_argument("--trace", action="store", default=None,
+                    help="Write a Chrome trace of the run (open in chrome://tracing or Perfetto) to this file.")
 
 args = parser.parse_args()
+if args.interval != 'percentile' and args.method == 'monte_carlo':
+    parser.error("--interval bca/studentized needs --method bootstrap")
+if args.method == 'monte_carlo' and args.tol is not None:
+    parser.error("--tol (adaptive bootstrap) needs --method bootstrap")
+if args.method == 'monte_carlo' and args.cache and not (args.batch or args.test or args.testall or args.pc
+                                                        or args.pc_all or args.sens):
+    parser.error("--cache has no effect with --method monte_carlo: the draws are not cached")
+if args.incremental and args.d != 'data':
+    parser.error("--incremental reads the whole data file; -d subsets are not supported with it")
+if args.joint and not args.bsplot and (args.tol is not None or args.method == 'monte_carlo'):
+    parser.error("--joint runs a fixed-size bootstrap; --tol and --method monte_carlo are not supported with it")
+if args.joint and args.e is not None and not (args.test or args.testall or args.pc or args.pc_all or args.sens
+                                              or args.bsplot):
+    parser.error("-e has no effect with --joint: the joint model is always fitted in closed form")
+if args.e is None:
+    args.e = 'semopy'
+if args.n is None:
+    args.n = 200000 if args.method == 'monte_carlo' else 2000
+
+
+def save_profile(profiler):
+    if args.profile:
+        profiler.save(args.profile)
+        print('')
+        print(f">>> Profile written to {args.profile}:")
+        print(profiler.summary().to_string())
+    if args.trace:
+        profiler.save_trace(args.trace)
+        print(f">>> Trace written to {args.trace}")
+
 
 if __name__ == "__main__":
+    profiler = Instrumentation.Profiler()
+    if args.profile or args.trace:
+        Instrumentation.observers.append(profiler)
+
+    if args.batch:
+        if args.cache:
+            MediationAnalyzer.cache = ResultCache()
+        failed = run_batch(load_jobs(args.batch), args.out)
+        save_profile(profiler)
+        sys.exit(1 if failed else 0)
+
     print('')
     print('Running all checks...')
     print('')
@@ -46,10 +175,31 @@ if __name__ == "__main__":
                  'SRS_P_2_Restricted_Interest_and_Repetitive_Behavior_T_Score',
                  'Motor_Composite_Score']
 
-    if args.d == 'ados':
-        sample = MediationAnalyzer.data
-    else:
-        sample = MediationAnalyzer.data
+    if args.cache:
+        MediationAnalyzer.cache = ResultCache()
+
+    # Subsets share the full data's column store and missingness masks; switching costs one row mask
+    sample = MediationAnalyzer.data if args.d == 'data' else MediationAnalyzer.data.with_subset(args.d)
+
+    if args.stats:
+        correlations = Correlations('PrimaryDx_ASD', ['PercentAccuracy_GTI'] + variables, dt=sample,
+                                    deletion=args.deletion)
+        correlations.descriptive_statistics(correction=args.correction)
+        print('')
+
+    if args.structure:
+        iv, dv = "PrimaryDx_ASD", "PercentAccuracy_GTI"
+        structure_data = sample.load([iv] + variables + [dv], complete=True)
+        arcs, score, mediators = learn_structure(structure_data, iv, dv, restarts=args.restarts, n_jobs=args.j,
+                                                 seed=args.seed)
+        print(f'>> Learned structure ({len(arcs)} arcs, BIC = {round(score, 3)}, '
+              f'Data count: {structure_data.shape[0]}):')
+        print(arcs.to_string(index=False))
+        print('')
+        print(f">>> Candidate mediators on {iv} -> ... -> {dv} paths: {', '.join(mediators) or 'none'}")
+        if mediators:
+            print(sweep(sample, mediators, iv, dv).to_string(index=False))
+        print('')
 
     if args.test:
         # DataFrame check for variables
@@ -71,13 +221,18 @@ if __name__ == "__main__":
 
             if args.m in ['sm', 'md', 'r']:
                 print(f'Results for {var}:')
-                m.analyze(model=args.m)
+                m.analyze(model=args.m, engine=args.e, n_rep=args.n, seed=args.seed)
             else:
                 model_choice = str(input('Which model would you like to use? [sm, r, md]  '))
                 print(f'Results for {var}:')
-                m.analyze(model=model_choice)
+                m.analyze(model=model_choice, engine=args.e, n_rep=args.n, seed=args.seed)
+
+    if args.testall and args.e == 'numpy':
+        # Single pass over all mediators with the closed-form engine
+        print(sweep(sample, variables).to_string(index=False))
+        print('')
 
-    if args.testall:
+    elif args.testall:
         for v in variables:
             try:
                 m = MediationAnalyzer(v, sample=sample)
@@ -92,13 +247,23 @@ if __name__ == "__main__":
             except SyntaxError:
                 print(f'!!!! SYNTAX ERROR ON {v} !!!!')
 
-    if args.pc_all:
+    if args.pc_all and args.e == 'numpy':
+        for row in sweep(sample, variables).itertuples():
+            summary = f">>> {round(row.percent_mediated, 3)}% of effect mediated by {row.mediator.replace('_', ' ')}"
+            for value in [row.p_a, row.p_c, row.p_b]:  # same order as the semopy table: A, C, B
+                if value < 0.05:
+                    print(colored(f"***{summary} (n = {row.n}, p = {value})***", attrs=['bold']))
+                else:
+                    print(f"{summary} (n = {row.n}, p = {value})")
+        print('')
+
+    elif args.pc_all:
         for v in variables:
             try:
                 m = MediationAnalyzer(v, sample=sample)
                 m.clean_data(info=False)
 
-                mediation_df = m.analyze(model='r')
+                mediation_df = m.analyze(model='r', engine=args.e)
                 for value in mediation_df['p-value'][0:3]:
                     if value < 0.05:
                         print(colored(
@@ -119,7 +284,7 @@ if __name__ == "__main__":
             m = MediationAnalyzer(var, sample=sample)
             m.clean_data(info=False)
 
-            mediation_df = m.analyze(model='r')
+            mediation_df = m.analyze(model='r', engine=args.e)
 
             if all(value < 0.05 for value in mediation_df['p-value'][0:3]):
                 print(
@@ -149,7 +314,7 @@ if __name__ == "__main__":
                 m = MediationAnalyzer(var, sample=sample)
                 m.clean_data(info=False)
 
-                mediation_df = m.analyze(model='r')
+                mediation_df = m.analyze(model='r', engine=args.e)
 
                 if all(value < 0.05 for value in mediation_df['p-value'][0:3]):
                     print(
@@ -174,38 +339,71 @@ if __name__ == "__main__":
             "Which mediator variable would you like to test? (separate with \", \" if multiple variables) ")
         variableList = variable.split(', ')
         print('')
-        for var in variableList:
-            m = MediationAnalyzer(var, sample=sample)
+        if args.joint:
+            # All entered mediators (up to 3, in serial order) in one joint model and one bootstrap
+            m = MediationAnalyzer(*variableList[:3], sample=sample)
             m.clean_data(info=False)
+            joint_results = m.analyze(model=args.joint, bootstrap=True, n_rep=args.n, n_jobs=args.j, seed=args.seed)
 
-            bootstrap_results = m.analyze(model='r', bootstrap=True)
+            print('')
+            print(f'>> {colored(f"Joint {args.joint} model", attrs=["bold"])} Bootstrapped Path Estimates:')
+            sleep(1)
+            print(joint_results.paths().to_string())
+            print('')
+            print('>> Specific indirect effects, total effects and contrasts (* interval excludes 0):')
+            sleep(1)
+            print(joint_results.effects().to_string())
+            print(f'** 95% confidence interval ({len(joint_results)} bootstrap replicates, '
+                  f'Data count: {m.data.shape[0]})')
+            print('')
+            variableList = []
 
-            # Convert the list of results to a DataFrame
-            bootstrap_estimates_df = pd.DataFrame(m.bootstrap_estimates)
-            bootstrap_pvals_df = pd.DataFrame(m.bootstrap_pval)
+        for var in variableList:
+            m = MediationAnalyzer(var, sample=sample)
+            m.clean_data(info=False)
 
-            # Compute the lower and upper bounds of the 95% confidence interval for each parameter
-            ci_lower = bootstrap_estimates_df.quantile(0.025)
-            ci_upper = bootstrap_estimates_df.quantile(0.975)
+            bootstrap_results = m.analyze(model='r', bootstrap=True, engine=args.e, n_rep=args.n, n_jobs=args.j,
+                                          seed=args.seed, tol=args.tol, method=args.method)
 
-            # Combine the lower and upper bounds into a single DataFrame for easy viewing
-            ci_df = pd.DataFrame({'Lower Bound': ci_lower, 'Upper Bound': ci_upper}).reindex([0, 2, 1])
+            # Lower and upper bounds of the 95% confidence interval for each parameter (A, B, C order)
+            ci_df = bootstrap_results.ci(method=args.interval)
             ci_df.set_index(pd.Index(['A Path -->', 'B Path -->', 'C Path -->']), inplace=True)
             print('')
             print(
                 f'>> {colored(var.replace("_", " "), attrs=["bold"])} Bootstrapped Regression Estimates:')
             sleep(1)
             print(ci_df)
-            print('** 95% confidence interval')
+            print(f'** 95% {args.interval} confidence interval ({len(bootstrap_results)} '
+                  f'{"Monte Carlo draws" if args.method == "monte_carlo" else "bootstrap replicates"})')
+            if len(bootstrap_results.dropped):
+                print(f'** {len(bootstrap_results.dropped)} non-converged bootstrap fits left out')
             print('')
+
+            effects_df = bootstrap_results.effects(method=args.interval)
+            effects_df.set_index(pd.Index(['Indirect Effect -->', 'Total Effect -->', 'Percent Mediated -->']),
+                                 inplace=True)
+            print(effects_df)
+            if m.sobel is not None:
+                print(f"** Sobel test: z = {round(m.sobel['z'], 3)}, p = {round(m.sobel['p'], 3)}")
+            print('')
+
+            if args.interval == 'percentile':
+                # Monte Carlo error of the bounds above (how much they would move with a different set of
+                # replicates); mc_errors tracks the percentile quantiles only
+                mc = bootstrap_results.mc_errors()['mc_se']
+                mc_df = pd.DataFrame({'Lower Bound': [mc[f'{p} lower'] for p in ['a', 'b', 'c']],
+                                      'Upper Bound': [mc[f'{p} upper'] for p in ['a', 'b', 'c']]}, index=ci_df.index)
+                print('>> Monte Carlo standard error of the bounds:')
+                print(mc_df)
+                print('')
             sleep(1)
             print(">> Percentage of bootstrapped p-values within 95% confidence interval:")
-            p_sig_prop = (bootstrap_pvals_df < 0.05).mean()
+            p_sig_prop = bootstrap_results.significance(0.05)
 
             sleep(1)
-            print(f'A Path --> {round(p_sig_prop[0] * 100, 2)}%')
-            print(f'B Path --> {round(p_sig_prop[2] * 100, 2)}%')
-            print(f'C Path --> {round(p_sig_prop[1] * 100, 2)}%')
+            print(f"A Path --> {round(p_sig_prop['a'] * 100, 2)}%")
+            print(f"B Path --> {round(p_sig_prop['b'] * 100, 2)}%")
+            print(f"C Path --> {round(p_sig_prop['c'] * 100, 2)}%")
             print('')
 
             print(f'>> {var.replace("_", " ")} Mediation Strength (95% confidence interval):')
@@ -213,6 +411,58 @@ if __name__ == "__main__":
             MediationAnalyzer.percent_mediated(ci_df)
             print('')
 
+    if args.stream:
+        variable = input(
+            "Which mediator variable would you like to test? (separate with \", \" if multiple variables) ")
+        print('')
+        for var in variable.split(', '):
+            print(f'>>> Streaming {args.stream} for {var} ({args.n} {args.weights} bootstrap replicates):')
+            table, n_rows, stream_results = streaming_bootstrap(args.stream, "PrimaryDx_ASD", var,
+                                                                "PercentAccuracy_GTI", n_rep=args.n,
+                                                                weights=args.weights, seed=args.seed)
+            print('')
+            print(f'>> {colored(var.replace("_", " "), attrs=["bold"])} Estimates (Data count: {n_rows}):')
+            print(table.iloc[0:3][['lval', 'op', 'rval', 'Estimate', 'Std. Err', 'p-value']].to_string())
+            print('')
+            print('>> Bootstrapped 95% confidence intervals:')
+            print(pd.concat([stream_results.ci(), stream_results.effects()]))
+            print('')
+
+    if args.sens:
+        variable = input(
+            ">>> Which mediator variable would you like to test? (separate with \", \" if multiple variables, or type "
+            "'all' to summarise all variables.) ")
+        print('')
+        if variable == 'all':
+            print(sensitivity_sweep(sample, variables).to_string(index=False))
+            print('** rho_null_min/max: range of rho over which the 95% delta-method interval of the ACME covers 0')
+            print('')
+        else:
+            for var in variable.split(', '):
+                m = MediationAnalyzer(var, sample=sample)
+                m.clean_data(info=False)
+                if args.sens == 'bootstrap':
+                    m.analyze(model='r', bootstrap=True, engine=args.e, n_rep=args.n, n_jobs=args.j, seed=args.seed)
+
+                table, rho_zero = m.sensitivity()
+                print(f'>> {colored(var.replace("_", " "), attrs=["bold"])} Sensitivity to mediator-outcome '
+                      f'confounding (Data count: {m.data.shape[0]}):')
+                # Every 0.1 of rho shown; the table holds the whole grid
+                print(table[(table['rho'] * 100).round() % 10 == 0].to_string(index=False))
+                print(f'** 95% {args.sens} confidence interval; ACME = 0 at rho = {round(rho_zero, 3)}')
+                print('')
+
+    if args.incremental:
+        estimator = IncrementalEstimator(variables, "PrimaryDx_ASD", "PercentAccuracy_GTI", path=sample.path,
+                                         key=args.key, n_rep=args.n, seed=args.seed, n_jobs=args.j)
+        report = estimator.update()
+        print(f">>> {report['rows']} rows: {report['added']} added, {report['changed']} changed, "
+              f"{report['removed']} removed{' (rebuilt)' if report['rebuilt'] else ''}")
+        print(f">>> Bootstraps refreshed: {', '.join(report['refreshed']) or 'none'}")
+        print('')
+        print(estimator.table().to_string())
+        print('')
+
     if args.bsplot:
         # DataFrame check for variables
         for v in variables:
@@ -235,110 +485,34 @@ if __name__ == "__main__":
             variableList = variable.split(', ')
         print('')
 
+        # Statistics first (bootstraps and the numbers shown on each figure), then all figures are rendered at once
+        jobs = []
         for var in variableList:
             m = MediationAnalyzer(var, X=X, Y=Y, sample=sample)
             m.clean_data(info=False)
 
             # Initialize bootstrapping
-            m.analyze(model='r', bootstrap=True)
-
-            est_lst = []  # list of percent effects from bootstrapped estimates (n=5000)
-            for i in range(2000):
-                estimate = MediationAnalyzer.mediation_percentage(m.bootstrap_estimates[i])
-                est_lst.append(estimate)
-
-            # Setting the strings for p-value information to be written on the text box
-            bootstrap_pvals_df = pd.DataFrame(m.bootstrap_pval) * len(variableList) # adjusting for multiple comparisons
-            p_sig_prop = (bootstrap_pvals_df < 0.05).mean()
-            box_title2 = 'Percentage of Significant\nBootstrapped Estimates**: \n  ** (p < 0.05)'
-            p1 = f'- A Path --> {round(p_sig_prop[0] * 100, 2)}%'
-            p2 = f'- B Path --> {round(p_sig_prop[2] * 100, 2)}%'
-            p3 = f'- C Path --> {round(p_sig_prop[1] * 100, 2)}%'
-
-            info_p = f"{box_title2}\n\n{p1}\n{p2}\n{p3}"  # p-value text box string
-
-            # Set the strings for your information
-            box_title1 = "Percent Effect of Mediation: \n"
-            l1 = f'- Lower Bound: {round(min(est_lst) * 100, 2)}%'
-            l2 = f'- Upper Bound: {round(max(est_lst) * 100, 2)}%'
-            l3 = f'- Mean: {round(np.mean(est_lst) * 100, 2)}%'
-            l4 = f'- Median: {round(np.median(est_lst) * 100, 2)}%'
-            l5 = f'  (SD: ±{round(np.std(est_lst) * 100, 2)})'
-
-            # Define the information string
-            info = f"{box_title1}\n\n{l1}\n{l2}\n\n{l3}\n{l4}\n{l5}"  # bounds, mean, and median text box string
-
-            # Creating the plot
-            my_series = pd.Series(est_lst) * 100
-            ceiling = ceil(max(my_series.values / 10)) * 10  # if max(my_series.values / 10) < 100 else 100
-            xlim = (floor(min(my_series.values)), ceiling)
-            # xlim = (floor(min(my_series.values)), 300)
-
-            fig, ax = plt.subplots(figsize=(16, 9))
-
-            my_series.plot.hist(bins=15, xlim=xlim, ax=ax,
-                                title=f'{m.M.replace("_", " ")} Mediation Effect (%) - {m.X} -> {m.Y}',
-                                density=True)
-
-            # Calculate the mean_value and the standard deviation of the regression estimates
-            mean_val = np.mean(my_series)
-            sd_val = np.std(my_series)
-
-            # Calculate bounds of shaded area
-            lower_bound = mean_val - sd_val if mean_val - sd_val >= 0 else 0
-            upper_bound = mean_val + sd_val
-
-            # Draw a dashed line on the histogram where the mean value is
-            plt.axvline(mean_val, color='red', linestyle='dashed', linewidth=2)
-
-            # Shade the area within one standard deviation of the mean
-            plt.axvspan(lower_bound, upper_bound, color='red', alpha=0.2)
-
-            # Set a threshold for 'closeness'
-            threshold = 0.2 * (max(est_lst) - min(est_lst))
-
-            # Get the current x-ticks
-            current_ticks = ax.get_xticks()
-
-            # Filter out ticks that are too close to the mean or mean ± SD
-            filtered_ticks = [tick for tick in current_ticks if not (abs(tick - mean_val) < threshold or
-                                                                     abs(tick - (mean_val - sd_val)) < threshold or
-                                                                     abs(tick - (mean_val + sd_val)) < threshold)]
-
-            # Add mean and SD ticks
-            special_ticks = [mean_val, mean_val - sd_val, mean_val + sd_val]
-            final_ticks = sorted(set(filtered_ticks + special_ticks))
-
-            # Set the x-ticks
-            ax.set_xticks(final_ticks)
-
-            # Custom labels for the mean and SD ticks
-            tick_labels = [f"{tick:.2f}" if tick in special_ticks else f"{tick:.0f}" for tick in final_ticks]
-            ax.set_xticklabels(tick_labels)
-
-            # Rotate labels for mean and SD ticks
-            for label in ax.get_xticklabels():
-                if label.get_text() in [f"{mean_val:.2f}", f"{mean_val - sd_val:.2f}", f"{mean_val + sd_val:.2f}"]:
-                    label.set_rotation(45)
-                    label.set_color('red')
-
-            # Place text box in bottom right and top right. The coordinates are in figure space.
-            plt.figtext(0.75, 0.6, info_p, ha='left', va='top', fontsize=11,
-                        bbox=dict(facecolor='none', edgecolor='black'))
-            plt.figtext(0.75, 0.85, info, ha='left', va='top', fontsize=11,
-                        bbox=dict(facecolor='none', edgecolor='black'))
+            bootstrap_results = m.analyze(model='r', bootstrap=True, engine=args.e, n_rep=args.n, n_jobs=args.j,
+                                          seed=args.seed, tol=args.tol, method=args.method)
 
-            sleep(1)
-            print('')
-            makedirs("Model_Histograms", exist_ok=True)
-            print(f">>> Saving histogram for {m.M} to {getcwd()}/Model_Histograms ...")
-            sleep(1)
-            # Save the plot
-            plt.savefig(f'{getcwd()}/Model_Histograms/{m.M} Percent Mediation ({m.X} vs. {m.Y}).png')
+            # Percent effects of all replicates and the text box numbers, adjusting for multiple comparisons
+            values, stats = histogram_stats(bootstrap_results, m.M, m.X, m.Y, n_tests=len(variableList),
+                                            interval=args.interval)
+            jobs.append((values, stats, f'{getcwd()}/Model_Histograms/{m.M} Percent Mediation ({m.X} vs. {m.Y})'))
 
-            print(f">>> Histogram for {m.M} successfully saved!")
-            plt.close()
-            print('')
+        print('')
+        print(f">>> Saving {len(jobs)} histogram(s) to {getcwd()}/Model_Histograms ...")
+        for path, written in render_all(jobs, formats=args.plot_format, n_jobs=args.j):
+            print(f">>> Histogram for {basename(path).split(' Percent Mediation')[0]} successfully saved! "
+                  f"({', '.join(splitext(f)[1][1:] for f in written)})")
+        print('')
         go_to_path = input("Would you like to view the plot? [y/n]  ")
         if go_to_path == 'y':
             system(f'open {getcwd()}/Model_Histograms')
+
+    if MediationAnalyzer.cache is not None:
+        stats = MediationAnalyzer.cache.stats()
+        print(f">>> Result cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['entries']} entries, {round(stats['bytes'] / 2 ** 20, 2)} MB)")
+
+    save_profile(profiler)
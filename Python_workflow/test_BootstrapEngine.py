@@ -0,0 +1,11 @@
+import numpy as np
+
+from BootstrapEngine import PATHS, fit_paths, jackknife_paths
+
+
+def test_jackknife_matches_refits(xmy):
+    x, m, y = xmy
+    refits = np.array([fit_paths(*(np.delete(v, i) for v in xmy))[0] for i in range(len(x))])
+    jackknife = jackknife_paths(x, m, y)
+    assert jackknife.shape == (len(x), len(PATHS))
+    np.testing.assert_allclose(jackknife, refits, rtol=1e-9, atol=1e-12)
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from BootstrapEngine import PATHS, numpy_block
+from BootstrapResult import BootstrapResult
+
+
+def test_studentized_total_effect(xmy):
+    result = BootstrapResult(*numpy_block(*xmy, 0, 400)).attach_fit(*xmy)
+    effects = result.effects(method='studentized')
+    assert np.isfinite(effects.loc[['indirect', 'total']].to_numpy()).all()
+    assert effects.loc['percent_mediated'].isna().all()
+
+    # Explicit bootstrap-t of c + ab with the delta-method SE sqrt(se_c^2 + a^2 se_b^2 + b^2 se_a^2)
+    def total_and_se(estimates, std_errs):
+        (a, c, b), (se_a, se_c, se_b) = (np.atleast_2d(v).T[[PATHS.index(p) for p in 'acb']]
+                                         for v in (estimates, std_errs))
+        return c + a * b, np.sqrt(se_c ** 2 + (a * se_b) ** 2 + (b * se_a) ** 2)
+
+    total, se = total_and_se(result.estimates, result.std_errs)
+    full, full_se = total_and_se(result.full, result.full_se)
+    t_lower, t_upper = np.quantile((total - full) / se, [0.025, 0.975])
+    expected = [full[0] - t_upper * full_se[0], full[0] - t_lower * full_se[0]]
+    assert effects.loc['total'].to_list() == pytest.approx(expected, rel=1e-12)
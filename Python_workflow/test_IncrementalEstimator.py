@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+import SyntheticData
+from IncrementalEstimator import IncrementalEstimator
+
+MEDIATORS = ['WISC_FSIQ', 'PKT_Total_Correct']
+ESTIMATES = [f'{name}{suffix}' for name in ['a', 'b', 'c'] for suffix in ['', ' SE', ' p']]
+
+
+def write(data, path):
+    data.to_csv(path, index=False)
+
+
+def test_incremental_update_matches_full_recompute(tmp_path):
+    data = SyntheticData.generate(400, missing=0.1, b=-0.002, seed=3)[[SyntheticData.X, SyntheticData.Y] + MEDIATORS]
+    data.insert(0, 'id', [f'row{i}' for i in range(len(data))])
+    path = str(tmp_path / 'data.csv')
+
+    def estimator(state):
+        return IncrementalEstimator(MEDIATORS, path=path, key='id', state_dir=str(tmp_path / state), n_rep=50,
+                                    seed=0)
+
+    incremental = estimator('incremental')
+    write(data.iloc[:300], path)
+    incremental.update(progress=False)
+
+    # Appended rows (only the new bytes are read), then changed and removed rows (matched by key)
+    write(data.iloc[:340], path)
+    assert not incremental.update(progress=False)['rebuilt']
+    edited = data.drop(index=[5, 17, 250]).copy()
+    edited.loc[[10, 11, 300], 'WISC_FSIQ'] += 7.5
+    edited.loc[12, 'PKT_Total_Correct'] = np.nan
+    write(edited, path)
+    report = incremental.update(progress=False)
+    assert (report['added'], report['removed'], report['changed']) == (60, 3, 4) and not report['rebuilt']
+
+    full = estimator('full')
+    assert full.update(progress=False)['rebuilt']
+    result, expected = incremental.table(), full.table()
+    assert (result['n'] == expected['n']).all()
+    pd.testing.assert_frame_equal(result[ESTIMATES], expected[ESTIMATES], rtol=1e-10)
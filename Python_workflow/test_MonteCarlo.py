@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from scipy.stats import norm
+
+from MonteCarlo import monte_carlo_draws, path_covariance, sobel_test
+
+
+def ols(design, y):
+    # Coefficients and ML (divisor n) covariance matrix
+    params, ssr = np.linalg.lstsq(design, y, rcond=None)[:2]
+    return params, ssr[0] / len(y) * np.linalg.inv(design.T @ design)
+
+
+def test_sobel_matches_explicit_regressions(xmy):
+    x, m, y = xmy
+    ones = np.ones_like(x)
+    (_, a), cov_a = ols(np.column_stack([ones, x]), m)
+    (_, c, b), cov_cb = ols(np.column_stack([ones, x, m]), y)
+
+    estimates, cov = path_covariance(x, m, y)
+    np.testing.assert_allclose(estimates, [a, c, b], rtol=1e-10)
+    np.testing.assert_allclose(cov, [[cov_a[1, 1], 0, 0], [0, cov_cb[1, 1], cov_cb[1, 2]],
+                                     [0, cov_cb[2, 1], cov_cb[2, 2]]], rtol=1e-8, atol=1e-300)
+
+    z = a * b / np.sqrt(b ** 2 * cov_a[1, 1] + a ** 2 * cov_cb[2, 2])
+    sobel = sobel_test(estimates, cov)
+    assert sobel['z'] == pytest.approx(z, rel=1e-8)
+    assert sobel['p'] == pytest.approx(2 * norm.sf(abs(z)), rel=1e-8)
+
+
+def test_draws_use_the_full_sample_standard_errors(xmy):
+    estimates, cov = path_covariance(*xmy)
+    draws, pvals, std_errs = monte_carlo_draws(estimates, cov, 1000, seed=0)
+    assert draws.shape == pvals.shape == std_errs.shape == (1000, 3)
+    np.testing.assert_array_equal(std_errs, np.broadcast_to(np.sqrt(np.diag(cov)), (1000, 3)))
+    np.testing.assert_allclose(pvals, 2 * norm.sf(np.abs(draws / std_errs)))
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+import SyntheticData
+from BootstrapEngine import resample_counts
+from MultiMediation import JointModel
+
+MEDIATORS = ['WISC_FSIQ', 'WMem_Composite_Score', 'PKT_Total_Correct']
+
+
+@pytest.mark.parametrize('serial', [False, True])
+def test_joint_fit_matches_lstsq(serial):
+    model = JointModel(SyntheticData.X, SyntheticData.Y, MEDIATORS, serial=serial)
+    values = model.values(SyntheticData.generate(200, b=-0.002, seed=1))
+    weights = np.vstack([np.ones(len(values)), resample_counts(len(values), 3, np.random.default_rng(0))])
+    estimates, std_errs, _ = model.fit(values, weights)
+
+    # Reference: each equation solved on the explicitly resampled rows, with ML (divisor n) standard errors
+    for r, counts in enumerate(weights.astype(int)):
+        rows = np.repeat(values, counts, axis=0)
+        for outcome, predictors in model.equations:
+            design = np.column_stack([np.ones(len(rows)), rows[:, predictors]])
+            params, ssr = np.linalg.lstsq(design, rows[:, outcome], rcond=None)[:2]
+            se = np.sqrt(ssr[0] / len(rows) * np.diag(np.linalg.inv(design.T @ design)))
+            cols = [model.paths.index(model._path_name(outcome, predictor, len(MEDIATORS)))
+                    for predictor in predictors]
+            np.testing.assert_allclose(estimates[r, cols], params[1:], rtol=1e-8)
+            np.testing.assert_allclose(std_errs[r, cols], se[1:], rtol=1e-6)
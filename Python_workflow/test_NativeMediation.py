@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from NativeMediation import bootstrap_mediation
+
+# Summary rows compared, and how far (as a share of the statsmodels interval width) the native estimates and bounds
+# may be from statsmodels'. The two draw different resamples, so they agree up to Monte Carlo error only: statsmodels
+# runs 400 replicates (it refits every one, ~10 s), the native engine 20000; over ten seeds the largest gap was 0.13.
+ROWS = ['ACME (average)', 'ADE (average)', 'Total effect']
+TOLERANCE = 0.2
+
+
+def test_matches_statsmodels(names, sample, xmy):
+    sm = pytest.importorskip('statsmodels.api')
+    from statsmodels.stats.mediation import Mediation
+
+    X, M, Y = names['X'], names['M'], names['Y']
+    outcome_model = sm.OLS.from_formula(f"{Y} ~ {M} + {X}", data=sample)
+    mediator_model = sm.OLS.from_formula(f"{M} ~ {X}", data=sample)
+    np.random.seed(0)
+    expected = Mediation(outcome_model, mediator_model, X, M).fit(n_rep=400, method='bootstrap').summary()
+
+    x, m, y = xmy
+    ones = np.ones_like(x)
+    summary = bootstrap_mediation(np.column_stack([ones, m, x]), np.column_stack([ones, x]), y, m, exp_outcome=2,
+                                  med_outcome=1, exp_mediator=1, n_rep=20000, seed=0)
+
+    assert list(summary.index) == list(expected.index)
+    width = expected.loc[ROWS, 'Upper CI bound'] - expected.loc[ROWS, 'Lower CI bound']
+    for column in ['Estimate', 'Lower CI bound', 'Upper CI bound']:
+        error = (summary.loc[ROWS, column] - expected.loc[ROWS, column]).abs() / width
+        assert (error < TOLERANCE).all(), (column, error.to_dict())
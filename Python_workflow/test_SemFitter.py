@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from BootstrapEngine import fit_paths, numpy_block, run_bootstrap
+from SemFitter import SemFitter, semopy_block
+
+
+@pytest.fixture(scope='module')
+def fitter(names, sample):
+    # Fitted to the full sample, so start() is the warm start of the replicate fits
+    pytest.importorskip('semopy')
+    fitter = SemFitter(names)
+    assert fitter.fit_data(sample).success
+    return fitter
+
+
+def test_closed_form_matches_semopy(fitter, xmy):
+    np.testing.assert_allclose(fitter.start()[fitter.positions], fit_paths(*xmy)[0], rtol=1e-5)
+
+
+def test_semopy_replicates_match_closed_form(fitter, sample, xmy):
+    # Same seed, same resamples: warm-started semopy fits must land on the closed-form solution
+    estimates, _, std_errs, info = semopy_block(fitter.names, fitter.spec, fitter.values(sample), fitter.start(),
+                                                7, 50)
+    expected, _, _ = numpy_block(*xmy, 7, 50)
+    assert info['not_converged'] == 0
+    assert np.isfinite(std_errs).all()
+    np.testing.assert_allclose(estimates, expected, rtol=1e-4)
+
+
+@pytest.mark.parametrize('engine', ['numpy', 'semopy'])
+def test_replicates_do_not_depend_on_n_jobs(engine, request, sample, xmy):
+    # 120 replicates are three seeded blocks, so n_jobs=2 runs them in a process pool
+    if engine == 'numpy':
+        block_fn, args = numpy_block, xmy
+    else:
+        fitter = request.getfixturevalue('fitter')
+        block_fn, args = semopy_block, (fitter.names, fitter.spec, fitter.values(sample), fitter.start())
+    serial = run_bootstrap(block_fn, args, n_rep=120, n_jobs=1, seed=3, progress=False)
+    parallel = run_bootstrap(block_fn, args, n_rep=120, n_jobs=2, seed=3, progress=False)
+    for expected, actual in zip(serial, parallel):
+        np.testing.assert_array_equal(actual, expected)
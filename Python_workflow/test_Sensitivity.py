@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from BootstrapEngine import PATHS, fit_paths, numpy_block
+from BootstrapResult import BootstrapResult
+from MonteCarlo import path_covariance, sobel_test
+from Sensitivity import acme_curve, sensitivity
+
+
+def test_rho_zero_is_the_unadjusted_indirect_effect(xmy):
+    estimates = fit_paths(*xmy)[0]
+    a, b = estimates[PATHS.index('a')], estimates[PATHS.index('b')]
+    result = BootstrapResult(*numpy_block(*xmy, 0, 200))
+
+    delta, rho_zero = sensitivity(*xmy)
+    at_zero = delta.set_index('rho').loc[0.0]
+    assert at_zero['acme'] == pytest.approx(a * b, rel=1e-12)
+    # Without replicates the rho = 0 interval is the Sobel interval
+    sobel = sobel_test(*path_covariance(*xmy))
+    assert at_zero['upper'] - at_zero['acme'] == pytest.approx(1.959964 * sobel['se'], rel=1e-6)
+
+    table, _ = sensitivity(*xmy, bootstrap=result)
+    lower, upper = np.percentile(result.indirect, [2.5, 97.5])
+    assert table.set_index('rho').loc[0.0, ['lower', 'upper']].to_list() == pytest.approx([lower, upper], rel=1e-12)
+
+    # rho_zero is where the curve crosses 0
+    resid = fit_paths(*xmy)[3]
+    assert acme_curve(a, b, resid[1] / resid[0], rho_zero)[0] == pytest.approx(0, abs=1e-12)
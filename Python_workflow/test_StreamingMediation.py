@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+
+import SyntheticData
+from BootstrapEngine import inspect_table
+from StreamingMediation import streaming_bootstrap
+
+
+def test_streaming_fit_matches_in_memory_fit(names, tmp_path):
+    X, M, Y = names['X'], names['M'], names['Y']
+    data = SyntheticData.generate(500, missing=0.1, b=-0.002, seed=2)[[X, M, Y]]
+    path = str(tmp_path / 'data.csv')
+    data.to_csv(path, index=False)
+
+    # Small chunks, so the sums are accumulated over many of them
+    table, n, result = streaming_bootstrap(path, X, M, Y, n_rep=20, seed=0, chunksize=37)
+    complete = data.dropna()
+    expected = inspect_table(X, Y, M, *(complete[var].to_numpy(dtype=np.float64) for var in [X, M, Y]))
+
+    assert n == len(complete)
+    assert len(result) == 20 and np.isfinite(result.estimates).all()
+    pd.testing.assert_frame_equal(table, expected, rtol=1e-9)
@@ -0,0 +1,58 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import StructureLearning
+
+
+def naive_climb(score, banned):
+    # Reference hill-climbing: every step re-scores every legal addition, deletion and reversal from scratch
+    k = len(banned)
+    parents = [set() for _ in range(k)]
+
+    def total(graph):
+        return sum(score(v, graph[v]) for v in range(k))
+
+    while True:
+        current, best = total(parents), None
+        for u, v in itertools.permutations(range(k), 2):
+            if u in parents[v]:
+                moves = [lambda g: g[v].discard(u)]
+                if not banned[v, u]:
+                    moves.append(lambda g: (g[v].discard(u), g[u].add(v)))
+            elif not banned[u, v]:
+                moves = [lambda g: g[v].add(u)]
+            else:
+                continue
+            for move in moves:
+                graph = [set(p) for p in parents]
+                move(graph)
+                if any(StructureLearning._reaches(graph, node, node) for node in range(k)):
+                    continue
+                gain = total(graph) - current
+                if gain > 1e-8 and (best is None or gain > best[0]):
+                    best = (gain, graph)
+        if best is None:
+            return parents, total(parents)
+        parents = best[1]
+
+
+def test_hill_climb_matches_naive_climb():
+    rng = np.random.default_rng(0)
+    n = 2000
+    x = rng.binomial(1, 0.5, n).astype(np.float64)
+    a = 0.8 * x + rng.normal(size=n)
+    b = 0.6 * a + rng.normal(size=n)
+    c = 0.5 * x + rng.normal(size=n)
+    d = rng.normal(size=n)
+    y = 0.7 * b + 0.4 * d + 0.3 * x + rng.normal(size=n)
+    data = pd.DataFrame({'X': x, 'A': a, 'B': b, 'C': c, 'D': d, 'Y': y})
+    cov = np.cov(data.to_numpy(), rowvar=False, bias=True)
+    banned = StructureLearning.blacklist(data.columns, 'X', 'Y')
+
+    parents, total, _ = StructureLearning.hill_climb(StructureLearning.FamilyScore(cov, n), banned)
+    expected, expected_total = naive_climb(StructureLearning.FamilyScore(cov, n), banned)
+    assert parents == expected
+    assert total == pytest.approx(expected_total)